@@ -0,0 +1,48 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks talk to a throwaway database on a local mongod. Point them
+elsewhere with BENCH_DATABASE_URL / BENCH_DATABASE_NAME.
+"""
+
+import os
+import sys
+import time
+
+# Allow `python benchmarks/<script>.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL", "mongodb://localhost:27017")
+BENCH_DATABASE_NAME = os.getenv("BENCH_DATABASE_NAME", "joybait_bench")
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[k]
+
+
+def report(label, latencies, elapsed):
+    """Print throughput and latency percentiles (latencies in seconds)"""
+    n = len(latencies)
+    rps = n / elapsed if elapsed else 0.0
+    print(
+        f"{label:<32} n={n:<7} {rps:>10.1f} req/s   "
+        f"p50={percentile(latencies, 50) * 1000:8.3f}ms   "
+        f"p99={percentile(latencies, 99) * 1000:8.3f}ms"
+    )
+
+
+class Timer:
+    """Context manager that records elapsed wall time in `.elapsed`"""
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._start
+        return False
@@ -0,0 +1,132 @@
+"""
+Sync (PyMongo in a threadpool) vs async (Motor) data layer under load.
+
+Uvicorn runs sync `def` endpoints in Starlette's threadpool, which is capped
+at 40 threads by default. This script replays the /gallery read and the
+/reflect write round trips at increasing concurrency through both modes and
+prints throughput and latency percentiles.
+
+    python benchmarks/async_vs_sync.py --requests 5000 --concurrency 50 200 1000
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+
+from _common import BENCH_DATABASE_NAME, BENCH_DATABASE_URL, Timer, report
+
+STARLETTE_THREADPOOL_SIZE = 40
+
+
+def seed(db, reflections: int):
+    db["reflection"].drop()
+    db["user"].drop()
+    now = datetime.now(timezone.utc)
+    db["user"].insert_one({"_id": "bench-user", "xp": 0, "streak": 0, "last_completed_at": None})
+    db["reflection"].insert_many(
+        [
+            {
+                "user_id": "bench-user",
+                "challenge_id": f"c{i % 4 + 1}",
+                "mood_before": 2,
+                "mood_after": 4,
+                "note": "bench",
+                "is_public": i % 2 == 0,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(reflections)
+        ]
+    )
+
+
+# ---- sync ops (what the old `def` endpoints did) ----
+
+def sync_gallery(db):
+    return list(db["reflection"].find({"is_public": True}).sort("created_at", -1).limit(20))
+
+
+def sync_reflect(db):
+    now = datetime.now(timezone.utc)
+    db["reflection"].insert_one(
+        {"user_id": "bench-user", "challenge_id": "c1", "mood_before": 2, "mood_after": 4,
+         "is_public": False, "created_at": now, "updated_at": now}
+    )
+    db["user"].find_one({"_id": "bench-user"})
+    db["user"].update_one({"_id": "bench-user"}, {"$set": {"last_completed_at": now}, "$inc": {"xp": 10}})
+
+
+# ---- async ops (what the `async def` endpoints do) ----
+
+async def async_gallery(adb):
+    return await adb["reflection"].find({"is_public": True}).sort("created_at", -1).limit(20).to_list(length=20)
+
+
+async def async_reflect(adb):
+    now = datetime.now(timezone.utc)
+    await adb["reflection"].insert_one(
+        {"user_id": "bench-user", "challenge_id": "c1", "mood_before": 2, "mood_after": 4,
+         "is_public": False, "created_at": now, "updated_at": now}
+    )
+    await adb["user"].find_one({"_id": "bench-user"})
+    await adb["user"].update_one({"_id": "bench-user"}, {"$set": {"last_completed_at": now}, "$inc": {"xp": 10}})
+
+
+async def drive(op, requests: int, concurrency: int):
+    """Issue `requests` calls of `op` with at most `concurrency` in flight"""
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            start = time.perf_counter()
+            await op()
+            latencies.append(time.perf_counter() - start)
+
+    with Timer() as t:
+        await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies, t.elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--seed", type=int, default=2000, help="reflections to seed")
+    args = parser.parse_args()
+
+    client = MongoClient(BENCH_DATABASE_URL, maxPoolSize=None)
+    db = client[BENCH_DATABASE_NAME]
+    aclient = AsyncIOMotorClient(BENCH_DATABASE_URL, maxPoolSize=None)
+    adb = aclient[BENCH_DATABASE_NAME]
+    seed(db, args.seed)
+
+    loop = asyncio.get_running_loop()
+    pool = ThreadPoolExecutor(max_workers=STARLETTE_THREADPOOL_SIZE)
+
+    def in_threadpool(fn):
+        return lambda: loop.run_in_executor(pool, fn, db)
+
+    for name, sync_fn, async_fn in (
+        ("gallery", sync_gallery, async_gallery),
+        ("reflect", sync_reflect, async_reflect),
+    ):
+        for c in args.concurrency:
+            lat, elapsed = await drive(in_threadpool(sync_fn), args.requests, c)
+            report(f"{name} sync  c={c}", lat, elapsed)
+            lat, elapsed = await drive(lambda: async_fn(adb), args.requests, c)
+            report(f"{name} async c={c}", lat, elapsed)
+
+    pool.shutdown()
+    client.drop_database(BENCH_DATABASE_NAME)
+    client.close()
+    aclient.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""
+/challenge/next filter cost: list comprehensions vs the bitset catalog.
+
+Pure CPU; no database needed.
+
+    python benchmarks/challenge_catalog.py --sizes 10000 100000
+"""
+
+import argparse
+import random
+import time
+
+from _common import report
+
+from catalog import ChallengeCatalog
+
+MOODS = ["social", "solo", "uplifting"]
+ENVIRONMENTS = ["home", "public", "school", "work"]
+
+
+def make_challenges(n: int):
+    rng = random.Random(n)
+    return [
+        {
+            "_id": f"c{i}",
+            "title": f"Challenge {i}",
+            "mood": rng.choice(MOODS),
+            "environment": rng.choice(ENVIRONMENTS),
+            "confidence": rng.randint(1, 5),
+        }
+        for i in range(n)
+    ]
+
+
+def make_filters(count: int):
+    rng = random.Random(0)
+    return [
+        {
+            "mood": rng.choice([None] + MOODS),
+            "environment": rng.choice([None] + ENVIRONMENTS),
+            "confidence_min": rng.choice([None, 1, 2, 3]),
+            "confidence_max": rng.choice([None, 3, 4, 5]),
+        }
+        for _ in range(count)
+    ]
+
+
+def scan_pick(challenges, rotation, mood, environment, confidence_min, confidence_max):
+    """The pre-catalog implementation of get_next_challenge"""
+    candidates = challenges
+    if mood:
+        candidates = [c for c in candidates if c["mood"] == mood]
+    if environment:
+        candidates = [c for c in candidates if c["environment"] == environment]
+    if confidence_min is not None:
+        candidates = [c for c in candidates if c["confidence"] >= confidence_min]
+    if confidence_max is not None:
+        candidates = [c for c in candidates if c["confidence"] <= confidence_max]
+    return candidates[rotation % len(candidates)] if candidates else None
+
+
+def timed(fn, filters):
+    latencies = []
+    start_all = time.perf_counter()
+    for i, f in enumerate(filters):
+        start = time.perf_counter()
+        fn(i, f)
+        latencies.append(time.perf_counter() - start)
+    return latencies, time.perf_counter() - start_all
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    filters = make_filters(args.queries)
+    for n in args.sizes:
+        challenges = make_challenges(n)
+        start = time.perf_counter()
+        catalog = ChallengeCatalog(challenges)
+        print(f"n={n}: index build {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        for i, f in enumerate(filters[:200]):
+            assert scan_pick(challenges, i, **f) == catalog.pick(i, **f)
+
+        lat, elapsed = timed(lambda i, f: scan_pick(challenges, i, **f), filters)
+        report(f"scan    n={n}", lat, elapsed)
+        lat, elapsed = timed(lambda i, f: catalog.pick(i, **f), filters)
+        report(f"bitset  n={n}", lat, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Cold start report: import time per module and time to first query.
+
+Runs each measurement in a fresh interpreter, the way a new worker starts.
+
+    python benchmarks/cold_start.py [--top 25]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+from _common import BENCH_DATABASE_NAME, BENCH_DATABASE_URL
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_MODULES = {name[:-3] for name in os.listdir(REPO) if name.endswith(".py")}
+
+FIRST_QUERY = """
+import asyncio, time
+t0 = time.perf_counter()
+import main, database
+t1 = time.perf_counter()
+async def first():
+    await database.get_async_db().command("ping")
+asyncio.run(first())
+t2 = time.perf_counter()
+print(f"{t1 - t0:.4f} {t2 - t1:.4f}")
+"""
+
+
+def import_times():
+    """(module, self_us, cumulative_us) from `python -X importtime -c 'import main'`"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=REPO, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    rows = import_times()
+    total = max(cum for _, _, cum in rows)
+    print(f"import main: {total / 1000:.1f}ms total\n")
+    print("app modules (cumulative):")
+    for name, self_us, cum in rows:
+        if name in APP_MODULES:
+            print(f"  {name:<24} {cum / 1000:8.1f}ms  (self {self_us / 1000:.1f}ms)")
+    print(f"\ntop {args.top} modules by self time:")
+    for name, self_us, cum in sorted(rows, key=lambda r: r[1], reverse=True)[: args.top]:
+        print(f"  {name:<40} {self_us / 1000:8.1f}ms")
+
+    env = {**os.environ, "DATABASE_URL": BENCH_DATABASE_URL, "DATABASE_NAME": BENCH_DATABASE_NAME}
+    proc = subprocess.run([sys.executable, "-c", FIRST_QUERY], cwd=REPO, env=env, capture_output=True, text=True)
+    if proc.returncode:
+        print(f"\nfirst query failed (is mongod running at {BENCH_DATABASE_URL}?)")
+        print(proc.stderr.strip().splitlines()[-1] if proc.stderr else "")
+        return 1
+    imported, first_query = (float(x) for x in proc.stdout.split())
+    print(f"\nimport: {imported * 1000:.1f}ms   client + first query: {first_query * 1000:.1f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,99 @@
+"""
+Reflection export memory: streamed NDJSON/CSV vs materializing the cursor.
+
+Seeds one user with N reflections, then drains export.stream_reflections
+while sampling RSS after every chunk. A flat curve (peak close to the
+starting RSS, independent of N) is the point of the streaming path; the
+list-based variant is shown for contrast.
+
+    python benchmarks/export_memory.py --reflections 1000000
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+from datetime import datetime, timedelta, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from _common import BENCH_DATABASE_NAME, BENCH_DATABASE_URL, Timer
+
+import export
+from indexes import ensure_indexes
+
+USER = "exporter"
+_PAGE = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * _PAGE / 2**20
+
+
+async def seed(adb, n: int):
+    await adb["reflection"].drop()
+    await ensure_indexes(adb)
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    for offset in range(0, n, 10_000):
+        await adb["reflection"].insert_many([
+            {
+                "user_id": USER,
+                "challenge_id": f"c{i % 50}",
+                "mood_before": 2,
+                "mood_after": 4,
+                "note": "a short note about how it went " * 4,
+                "is_public": i % 2 == 0,
+                "created_at": start + timedelta(seconds=i * 30),
+            }
+            for i in range(offset, min(offset + 10_000, n))
+        ])
+
+
+async def streamed(adb, fmt: str, batch_size: int):
+    base = peak = rss_mb()
+    total = 0
+    with Timer() as t:
+        async for chunk in export.stream_reflections(adb, USER, fmt, batch_size=batch_size):
+            total += len(chunk)
+            peak = max(peak, rss_mb())
+    print(
+        f"stream {fmt:<6} batch={batch_size:<6}       {total / 2**20:8.1f} MiB out "
+        f"{t.elapsed:7.2f}s   rss start={base:7.1f} MiB peak=+{peak - base:6.1f} MiB"
+    )
+
+
+async def materialized(adb):
+    base = rss_mb()
+    with Timer() as t:
+        docs = await adb["reflection"].find({"user_id": USER}).sort("created_at", 1).to_list(length=None)
+        body = export.ndjson_chunk(export.row(d) for d in docs)
+    print(
+        f"to_list + dumps          rows={len(docs):<8} {len(body) / 2**20:8.1f} MiB out "
+        f"{t.elapsed:7.2f}s   rss start={base:7.1f} MiB peak=+{rss_mb() - base:6.1f} MiB"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reflections", type=int, default=1_000_000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--skip-materialized", action="store_true", help="skip the list-based comparison")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(BENCH_DATABASE_URL)
+    adb = client[BENCH_DATABASE_NAME]
+    await seed(adb, args.reflections)
+    for batch_size in args.batch_sizes:
+        await streamed(adb, "ndjson", batch_size)
+    await streamed(adb, "csv", args.batch_sizes[-1])
+    if not args.skip_materialized:
+        # Last: it grows the heap and RSS rarely shrinks back afterwards
+        await materialized(adb)
+    print(f"max rss {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+    await client.drop_database(BENCH_DATABASE_NAME)
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
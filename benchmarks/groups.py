@@ -0,0 +1,103 @@
+"""
+Group endpoints at scale: joins, challenge fan-out, "my groups" and the
+group feed against a group with many members.
+
+    python benchmarks/groups.py --members 10000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from _common import BENCH_DATABASE_NAME, BENCH_DATABASE_URL, Timer, report
+
+os.environ["DATABASE_URL"] = BENCH_DATABASE_URL
+os.environ["DATABASE_NAME"] = BENCH_DATABASE_NAME
+
+import database  # noqa: E402  (needs the env above)
+import groups  # noqa: E402
+from indexes import ensure_indexes  # noqa: E402
+
+OWNER = "owner"
+
+
+async def timed(fn, runs: int):
+    latencies = []
+    start_all = time.perf_counter()
+    for _ in range(runs):
+        start = time.perf_counter()
+        await fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies, time.perf_counter() - start_all
+
+
+async def seed_reflections(adb, members: int, challenge_id: str, n: int):
+    rng = random.Random(n)
+    now = datetime.now(timezone.utc)
+    docs = [
+        {
+            # Half the reflections come from people outside the group
+            "user_id": f"m{rng.randrange(members)}" if i % 2 else f"outsider-{i}",
+            "challenge_id": challenge_id,
+            "mood_before": 2,
+            "mood_after": 4,
+            "note": "x" * 120,
+            "is_public": bool(i % 3),
+            "created_at": now - timedelta(seconds=i),
+        }
+        for i in range(n)
+    ]
+    for i in range(0, len(docs), 10_000):
+        await adb["reflection"].insert_many(docs[i:i + 10_000])
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, default=10_000)
+    parser.add_argument("--reflections", type=int, default=50_000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    adb = database.get_async_db()
+    for name in (groups.GROUP, groups.MEMBER, "reflection"):
+        await adb[name].drop()
+    await ensure_indexes(adb)
+
+    group = await groups.create_group(adb, "Bench", OWNER, "BENCH1")
+    gid = group["id"]
+
+    latencies = []
+    with Timer() as t:
+        for i in range(args.members - 1):
+            start = time.perf_counter()
+            await groups.join_group(adb, gid, f"m{i}")
+            latencies.append(time.perf_counter() - start)
+    report("join", latencies, t.elapsed)
+
+    lat, elapsed = await timed(lambda: groups.join_group(adb, gid, "m0"), args.runs)
+    report("join (already member)", lat, elapsed)
+
+    # Every member also sits in a handful of small groups
+    for g in range(5):
+        await groups.create_group(adb, f"Small {g}", "m0", f"SMALL{g}")
+
+    await seed_reflections(adb, args.members, "c1", args.reflections)
+
+    lat, elapsed = await timed(lambda: groups.set_group_challenge(adb, gid, OWNER, "c1"), args.runs)
+    report(f"set challenge ({args.members} members)", lat, elapsed)
+
+    lat, elapsed = await timed(lambda: groups.groups_for_user(adb, "m0"), args.runs * 10)
+    report("groups for user", lat, elapsed)
+
+    lat, elapsed = await timed(lambda: groups.group_feed(adb, gid, limit=20), args.runs)
+    report(f"group feed (limit 20, {args.reflections} refl)", lat, elapsed)
+
+    await adb.client.drop_database(BENCH_DATABASE_NAME)
+    database.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""
+get_documents (list) vs iter_documents (generator) vs find_document.
+
+Peak Python heap is measured with tracemalloc in a separate pass from the
+timing runs, so tracing overhead does not distort latency.
+
+    python benchmarks/iter_documents.py --documents 200000
+"""
+
+import argparse
+import os
+import time
+import tracemalloc
+
+from _common import BENCH_DATABASE_NAME, BENCH_DATABASE_URL, percentile
+
+os.environ["DATABASE_URL"] = BENCH_DATABASE_URL
+os.environ["DATABASE_NAME"] = BENCH_DATABASE_NAME
+
+import database  # noqa: E402  (needs the env above)
+from database import find_document, get_documents, iter_documents, sort_key  # noqa: E402
+
+COLLECTION = "iter_bench"
+
+
+def seed(n: int):
+    db = database.get_db()
+    db[COLLECTION].drop()
+    for offset in range(0, n, 10_000):
+        db[COLLECTION].insert_many(
+            [{"seq": i, "email": f"user{i}@example.com", "note": "x" * 200} for i in range(offset, min(offset + 10_000, n))]
+        )
+    db[COLLECTION].create_index("email")
+    db[COLLECTION].create_index("seq")
+
+
+def consume(rows) -> int:
+    count = 0
+    for _ in rows:
+        count += 1
+    return count
+
+
+def keyset_walk(page_size: int) -> int:
+    sort, after, total = [("seq", 1), ("_id", 1)], None, 0
+    while True:
+        page = list(iter_documents(COLLECTION, projection={"seq": 1}, sort=sort, limit=page_size, after=after))
+        total += len(page)
+        if len(page) < page_size:
+            return total
+        after = sort_key(page[-1], sort)
+
+
+def measure(label: str, fn, runs: int):
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    print(
+        f"{label:<36} p50={percentile(latencies, 50) * 1000:9.2f}ms   "
+        f"p99={percentile(latencies, 99) * 1000:9.2f}ms   peak heap={peak / 2**20:8.2f} MiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=200_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    seed(args.documents)
+    email = f"user{args.documents // 2}@example.com"
+
+    measure("get_documents (list) full scan", lambda: consume(get_documents(COLLECTION)), args.runs)
+    measure("iter_documents full scan", lambda: consume(iter_documents(COLLECTION, batch_size=1000)), args.runs)
+    measure(
+        "iter_documents projected",
+        lambda: consume(iter_documents(COLLECTION, projection={"seq": 1}, batch_size=1000)),
+        args.runs,
+    )
+    measure("keyset walk, 1000/page", lambda: keyset_walk(1000), args.runs)
+    measure("get_documents(...)[0] by email", lambda: get_documents(COLLECTION, {"email": email})[0], args.runs * 20)
+    measure("find_document by email", lambda: find_document(COLLECTION, {"email": email}), args.runs * 20)
+
+    database.get_db()[COLLECTION].drop()
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Join code allocation under concurrency and cached code lookups.
+
+Runs many concurrent allocations against the pool, checks that no code
+was handed out twice, then times resolve() for cached hits, negative-cached
+misses and cold lookups.
+
+    python benchmarks/join_codes.py --creators 200 --groups 5000
+"""
+
+import argparse
+import asyncio
+import time
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from _common import BENCH_DATABASE_NAME, BENCH_DATABASE_URL, Timer, report
+
+from indexes import ensure_indexes
+from joincodes import COLLECTION, JoinCodes
+
+
+async def timed_calls(fn, args):
+    latencies = []
+    with Timer() as t:
+        for a in args:
+            start = time.perf_counter()
+            await fn(a)
+            latencies.append(time.perf_counter() - start)
+    return latencies, t.elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--creators", type=int, default=200, help="concurrent group creators")
+    parser.add_argument("--groups", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(BENCH_DATABASE_URL)
+    adb = client[BENCH_DATABASE_NAME]
+    await adb[COLLECTION].drop()
+    await ensure_indexes(adb)
+
+    codes = JoinCodes(batch_size=args.batch_size, low_water=args.batch_size // 5)
+    await codes.top_up(adb)
+
+    group_ids = [str(ObjectId()) for _ in range(args.groups)]
+    latencies = []
+
+    async def creator(ids):
+        for gid in ids:
+            start = time.perf_counter()
+            await codes.allocate(adb, gid)
+            latencies.append(time.perf_counter() - start)
+
+    with Timer() as t:
+        await asyncio.gather(*(creator(group_ids[i::args.creators]) for i in range(args.creators)))
+    report(f"allocate x{args.creators} concurrent", latencies, t.elapsed)
+
+    claimed = await adb[COLLECTION].find({"group_id": {"$ne": None}}, {"_id": 1, "group_id": 1}).to_list(None)
+    unique_codes = len({c["_id"] for c in claimed})
+    unique_groups = len({c["group_id"] for c in claimed})
+    print(f"claimed={len(claimed)} unique codes={unique_codes} unique groups={unique_groups}")
+    assert unique_codes == unique_groups == args.groups
+
+    sample = [c["_id"] for c in claimed[:1000]]
+    lat, elapsed = await timed_calls(lambda c: codes.resolve(adb, c), sample)
+    report("resolve (cached)", lat, elapsed)
+
+    cold = JoinCodes()
+    lat, elapsed = await timed_calls(lambda c: cold.resolve(adb, c), sample)
+    report("resolve (cold)", lat, elapsed)
+
+    bogus = [f"NOPE{i:04d}" for i in range(200)] * 5
+    lat, elapsed = await timed_calls(lambda c: codes.resolve(adb, c), bogus)
+    report("resolve (unknown, neg-cached)", lat, elapsed)
+
+    await client.drop_database(BENCH_DATABASE_NAME)
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
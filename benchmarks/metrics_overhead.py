@@ -0,0 +1,114 @@
+"""
+Metrics recording overhead: the ASGI middleware per request,
+Histogram.observe from one thread and from several at once (as Motor's
+executor threads record command timings), and the per-command cost of the
+command listeners, including the slow query log for commands under its
+threshold. The budget is 20µs per request. No database needed.
+
+    python benchmarks/metrics_overhead.py --requests 200000 --threads 8
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import _common  # noqa: F401  (puts the repo root on sys.path)
+
+from metrics import MONGO_BUCKETS, CommandTimer, Histogram, MetricsMiddleware
+from slowlog import SlowQueryLog
+
+BUDGET_US = 20.0
+
+ROUTE = SimpleNamespace(path="/user/{user_id}/profile")
+START = {"type": "http.response.start", "status": 200, "headers": []}
+BODY = {"type": "http.response.body", "body": b"{}"}
+
+
+async def endpoint(scope, receive, send):
+    # What the router does for a matched route, minus the work
+    scope["route"] = ROUTE
+    await send(START)
+    await send(BODY)
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def per_request(app, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        await app({"type": "http", "method": "GET", "path": "/user/1/profile"}, receive, send)
+    return (time.perf_counter() - start) / n
+
+
+def observe_loop(histogram: Histogram, n: int, labels: tuple):
+    for i in range(n):
+        histogram.observe(labels, (i % 1000) / 100_000)
+
+
+def threaded(histogram: Histogram, n: int, threads: int) -> float:
+    workers = [
+        threading.Thread(target=observe_loop, args=(histogram, n, (f"c{t % 4}", "find", "ok")))
+        for t in range(threads)
+    ]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return (time.perf_counter() - start) / (n * threads)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    n = args.requests
+
+    bare = asyncio.run(per_request(endpoint, n))
+    timed = asyncio.run(per_request(MetricsMiddleware(endpoint), n))
+    overhead = (timed - bare) * 1e6
+    print(f"{'bare ASGI app':<40} {bare * 1e6:8.2f} µs/request")
+    print(f"{'with MetricsMiddleware':<40} {timed * 1e6:8.2f} µs/request")
+    print(f"{'middleware overhead':<40} {overhead:8.2f} µs/request (budget {BUDGET_US:.0f})")
+
+    histogram = Histogram("bench", "bench", ("collection", "command", "outcome"), MONGO_BUCKETS)
+    start = time.perf_counter()
+    observe_loop(histogram, n, ("user", "find", "ok"))
+    print(f"{'observe, 1 thread':<40} {(time.perf_counter() - start) / n * 1e6:8.2f} µs/op")
+    per_op = threaded(histogram, n // args.threads, args.threads)
+    print(f"{f'observe, {args.threads} threads':<40} {per_op * 1e6:8.2f} µs/op (wall, all threads)")
+    counted = sum(sum(cell[:-1]) for cell in histogram.snapshot().values())
+    expected = n + (n // args.threads) * args.threads
+    print(f"{'samples counted':<40} {counted}/{expected}")
+
+    timer = CommandTimer(histogram)
+    started = SimpleNamespace(request_id=1, command_name="find", command={"find": "reflection", "filter": {}})
+    done = SimpleNamespace(request_id=1, command_name="find", duration_micros=850, reply={"ok": 1})
+    start = time.perf_counter()
+    for _ in range(n):
+        timer.started(started)
+        timer.succeeded(done)
+    print(f"{'CommandTimer started+succeeded':<40} {(time.perf_counter() - start) / n * 1e6:8.2f} µs/command")
+
+    slow = SlowQueryLog(threshold_ms=100)
+    start = time.perf_counter()
+    for _ in range(n):
+        slow.started(started)
+        slow.succeeded(done)
+    print(f"{'SlowQueryLog, under threshold':<40} {(time.perf_counter() - start) / n * 1e6:8.2f} µs/command")
+
+    assert counted == expected, "samples lost"
+    assert overhead < BUDGET_US, "middleware over budget"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+/reflect throughput at different connection pool sizes.
+
+Each round reconnects the app's async client with MONGO_MAX_POOL_SIZE set
+to the round's value, then drives the submit_reflection endpoint at fixed
+concurrency against a local mongod and reports the pool monitor's peak
+usage and wait-queue timeouts alongside latency.
+
+    python benchmarks/pool_sizes.py --pool-sizes 5 10 25 50 100 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from _common import BENCH_DATABASE_NAME, BENCH_DATABASE_URL, Timer, report
+
+os.environ["DATABASE_URL"] = BENCH_DATABASE_URL
+os.environ["DATABASE_NAME"] = BENCH_DATABASE_NAME
+
+from bson import ObjectId  # noqa: E402
+
+import database  # noqa: E402  (needs the env above)
+import ids  # noqa: E402
+import main  # noqa: E402
+
+USERS = 100
+
+
+async def run_round(pool_size: int, requests: int, concurrency: int):
+    os.environ["MONGO_MAX_POOL_SIZE"] = str(pool_size)
+    database.close()
+    database.pool_monitor.reset()
+    adb = database.get_async_db()
+    await adb["user"].delete_many({})
+    oids = [ObjectId() for _ in range(USERS)]
+    await adb["user"].insert_many([{"_id": oid, "xp": 0, "streak": 0} for oid in oids])
+    user_ids = [ids.encode(oid) for oid in oids]
+
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        payload = main.ReflectionRequest(user_id=user_ids[i % USERS], challenge_id="c1", mood_before=2, mood_after=4)
+        async with sem:
+            start = time.perf_counter()
+            await main.submit_reflection(payload, idempotency_key=None)
+            latencies.append(time.perf_counter() - start)
+
+    with Timer() as t:
+        await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies, t.elapsed
+
+
+async def amain():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[5, 10, 25, 50, 100])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    for size in args.pool_sizes:
+        lat, elapsed = await run_round(size, args.requests, args.concurrency)
+        report(f"maxPoolSize={size}", lat, elapsed)
+        stats = database.pool_monitor.stats()
+        print(f"    peak_in_use={stats['peak_in_use']} wait_queue_timeouts={stats['wait_queue_timeouts']}")
+
+    await database.get_async_db().client.drop_database(BENCH_DATABASE_NAME)
+    database.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(amain())
@@ -0,0 +1,91 @@
+"""
+/user/{id}/profile latency with and without the profile cache.
+
+Seeds users with reflections in a local mongod and calls the endpoint
+coroutine directly, so the numbers isolate the data path from HTTP parsing.
+
+    python benchmarks/profile_cache.py --users 1000 --calls 20000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from _common import BENCH_DATABASE_NAME, BENCH_DATABASE_URL, Timer, report
+
+os.environ["DATABASE_URL"] = BENCH_DATABASE_URL
+os.environ["DATABASE_NAME"] = BENCH_DATABASE_NAME
+
+from bson import ObjectId  # noqa: E402
+
+import database  # noqa: E402  (needs the env above)
+import ids  # noqa: E402
+import main  # noqa: E402
+from database import db  # noqa: E402
+
+
+def seed(users: int, reflections_per_user: int) -> list:
+    """Seed users (stored under ObjectIds, as signup does); returns their API ids"""
+    db["user"].drop()
+    db["reflection"].drop()
+    now = datetime.now(timezone.utc)
+    oids = [ObjectId() for _ in range(users)]
+    db["user"].insert_many(
+        [{"_id": oid, "name": f"User {i}", "mode": "casual", "xp": i, "streak": i % 7} for i, oid in enumerate(oids)]
+    )
+    user_ids = [ids.encode(oid) for oid in oids]
+    db["reflection"].insert_many(
+        [
+            {
+                "user_id": user_ids[i],
+                "challenge_id": "c1",
+                "mood_before": 2,
+                "mood_after": 4,
+                "note": "x" * 200,
+                "is_public": False,
+                "created_at": now - timedelta(minutes=j),
+            }
+            for i in range(users)
+            for j in range(reflections_per_user)
+        ]
+    )
+    db["reflection"].create_index([("user_id", 1), ("created_at", -1)])
+    return user_ids
+
+
+async def run(calls: int, user_ids: list, cached: bool):
+    picks = [random.choice(user_ids) for _ in range(calls)]
+    main.profile_cache.clear()
+    latencies = []
+    with Timer() as t:
+        for uid in picks:
+            if not cached:
+                main.profile_cache.invalidate(uid)
+            start = time.perf_counter()
+            await main.get_profile(uid)
+            latencies.append(time.perf_counter() - start)
+    return latencies, t.elapsed
+
+
+async def amain():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--reflections", type=int, default=20, help="reflections per user")
+    parser.add_argument("--calls", type=int, default=10000)
+    args = parser.parse_args()
+
+    user_ids = seed(args.users, args.reflections)
+    database.get_async_db()
+    for cached in (False, True):
+        lat, elapsed = await run(args.calls, user_ids, cached)
+        report("profile cached" if cached else "profile uncached", lat, elapsed)
+    print("cache stats:", main.profile_cache.stats())
+    db.client.drop_database(BENCH_DATABASE_NAME)
+    database.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(amain())
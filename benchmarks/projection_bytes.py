@@ -0,0 +1,110 @@
+"""
+Bytes per request before and after projections, per endpoint read.
+
+Documents are fetched as RawBSONDocument so the numbers are the exact BSON
+sizes MongoDB returns (and the driver would otherwise decode), with and
+without each endpoint's declared projection.
+
+    python benchmarks/projection_bytes.py
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import MongoClient
+
+from _common import BENCH_DATABASE_NAME, BENCH_DATABASE_URL
+
+import catalog
+import gallery
+import main
+
+RAW = CodecOptions(document_class=RawBSONDocument)
+USER = "bytes-user"
+
+
+def seed(db, users: int):
+    for name in ("user", "reflection", "challenge"):
+        db[name].drop()
+    now = datetime.now(timezone.utc)
+    prefs = {"filters": {f"tag{i}": {"enabled": i % 2 == 0, "weight": i} for i in range(60)}, "theme": "dark"}
+    db["user"].insert_many([
+        {
+            "_id": f"u{i}",
+            "name": f"User {i}",
+            "email": f"user{i}@example.com",
+            "mode": "casual",
+            "xp": i * 10,
+            "streak": i % 7,
+            "last_completed_at": now,
+            "preferences": prefs,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(users)
+    ])
+    db["reflection"].insert_many([
+        {
+            "user_id": USER if i % 2 else f"u{i % users}",
+            "challenge_id": f"c{i % 20}",
+            "mood_before": 2,
+            "mood_after": 4,
+            "note": "Today I said hello to a stranger on the bus and it went fine. " * 8,
+            "is_public": True,
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now - timedelta(minutes=i),
+        }
+        for i in range(2000)
+    ])
+    db["user"].insert_one({**db["user"].find_one({"_id": "u0"}), "_id": USER})
+    db["challenge"].insert_many([{**c, "created_at": now, "updated_at": now} for c in main.SEED_CHALLENGES])
+
+
+def size(cursor) -> int:
+    return sum(len(d.raw) for d in cursor)
+
+
+def run():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    client = MongoClient(BENCH_DATABASE_URL)
+    db = client.get_database(BENCH_DATABASE_NAME, codec_options=RAW)
+    seed(client[BENCH_DATABASE_NAME], args.users)
+    batch_ids = [f"u{i}" for i in range(min(args.users, 50))]
+
+    # (endpoint, read, fetch(projection-or-None), declared projection)
+    reads = [
+        ("/user/{id}/profile", "user", lambda p: size([db["user"].find_one({"_id": USER}, p)]), main.PROFILE_USER_FIELDS),
+        (
+            "/user/{id}/profile", "recent reflections",
+            lambda p: size(db["reflection"].find({"user_id": USER}, p).sort("created_at", -1).limit(main.RECENT_REFLECTIONS)),
+            main.PROFILE_REFLECTION_FIELDS,
+        ),
+        (
+            "/gallery", f"page of {gallery.MAX_PAGE_SIZE}",
+            lambda p: size(db["reflection"].find(gallery.GALLERY_FILTER, p).sort(gallery.GALLERY_SORT).limit(gallery.MAX_PAGE_SIZE)),
+            gallery.GALLERY_PROJECTION,
+        ),
+        (
+            "/reflect/batch", f"{len(batch_ids)} users",
+            lambda p: size(db["user"].find({"_id": {"$in": batch_ids}}, p)),
+            main.STREAK_FIELDS,
+        ),
+        ("catalog load", "all challenges", lambda p: size(db["challenge"].find({}, p)), catalog._PROJECTION),
+    ]
+
+    print(f"{'endpoint':<22}{'read':<22}{'before':>10}{'after':>10}{'saved':>8}")
+    for endpoint, label, fetch, projection in reads:
+        before, after = fetch(None), fetch(projection)
+        print(f"{endpoint:<22}{label:<22}{before:>9}B{after:>9}B{(1 - after / before) * 100:>7.0f}%")
+
+    client.drop_database(BENCH_DATABASE_NAME)
+    client.close()
+
+
+if __name__ == "__main__":
+    run()
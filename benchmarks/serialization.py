@@ -0,0 +1,141 @@
+"""
+Response serialization CPU: FastAPI's default path vs orjson vs
+pre-serialized bytes, on realistic profile, gallery and challenge payloads.
+
+"default" is what a plain dict return costs: jsonable_encoder followed by
+JSONResponse.render (json.dumps). Deep gallery pages also include BSON
+decoding; RawBSONDocument is measured there too, since project() reads
+every returned field and lazy decoding has nothing to skip. No database
+needed.
+
+    python benchmarks/serialization.py --iterations 20000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import bson
+from bson import ObjectId
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import _common  # noqa: F401  (puts the repo root on sys.path)
+
+from catalog import ChallengeIndex
+from gallery import _entry, project
+from serialization import ORJSONResponse, dumps, join_array
+
+RAW_BSON = CodecOptions(document_class=RawBSONDocument)
+
+
+def reflections(n: int):
+    rng = random.Random(n)
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "_id": ObjectId(),
+            "challenge_id": f"c{rng.randint(1, 50)}",
+            "mood_before": rng.randint(1, 3),
+            "mood_after": rng.randint(3, 5),
+            "note": "Said hi to the barista and asked how their day was. " * rng.randint(1, 4),
+            "created_at": now - timedelta(minutes=i),
+        }
+        for i in range(n)
+    ]
+
+
+def profile_payload(str_ids: bool) -> dict:
+    refs = reflections(5)
+    return {
+        "user": {"_id": "64f0c0ffee0000000000abcd", "name": "Sam", "mode": "casual", "xp": 1240, "streak": 9},
+        "badges": ["First Spark", "Streak Starter", "Joy Builder", "Bright Flame"],
+        "recent_reflections": [
+            {**{k: r[k] for k in ("challenge_id", "mood_before", "mood_after", "note", "created_at")},
+             "id": str(r["_id"]) if str_ids else r["_id"]}
+            for r in refs
+        ],
+        "rank": {"xp_all": 1523, "xp_day": 88, "xp_week": 402, "streak_all": 311},
+    }
+
+
+def challenges(n: int):
+    rng = random.Random(n)
+    return [
+        {
+            "_id": f"c{i}",
+            "title": f"Challenge {i}",
+            "description": "Do one small kind thing for someone nearby and notice how it feels.",
+            "mood": rng.choice(["social", "solo", "uplifting"]),
+            "environment": rng.choice(["home", "public", "school", "work"]),
+            "confidence": rng.randint(1, 5),
+        }
+        for i in range(n)
+    ]
+
+
+def default_render(payload) -> bytes:
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def bench(label: str, fn, iterations: int):
+    fn()
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    per_op = (time.process_time() - start) / iterations
+    print(f"{label:<44} {per_op * 1e6:10.1f} µs CPU/op")
+    return per_op
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20_000)
+    parser.add_argument("--catalog", type=int, default=500)
+    args = parser.parse_args()
+    n = args.iterations
+
+    print("-- /user/{id}/profile")
+    str_profile, raw_profile = profile_payload(True), profile_payload(False)
+    base = bench("default (str ids, jsonable_encoder)", lambda: default_render(str_profile), n)
+    new = bench("ORJSONResponse (ObjectId, datetime)", lambda: ORJSONResponse(raw_profile).body, n)
+    print(f"{'speedup':<44} {base / new:10.1f}x")
+
+    for size in (20, 50):
+        print(f"-- /gallery, {size} items")
+        docs = reflections(size)
+        items = [{**project(d), "id": str(d["_id"])} for d in docs]
+        fragments = [_entry(d)[3] for d in docs]
+        base = bench("default", lambda: default_render(items), n)
+        bench("orjson dumps per request", lambda: dumps([project(d) for d in docs]), n)
+        new = bench("pre-serialized buffer (join)", lambda: join_array(fragments), n)
+        print(f"{'speedup':<44} {base / new:10.1f}x")
+
+        print(f"-- /gallery deep page, {size} items from BSON")
+        wire = b"".join(bson.encode({k: d[k] for k in ("_id", "challenge_id", "note", "mood_after", "created_at")}) for d in docs)
+        base = bench(
+            "decode dicts + default",
+            lambda: default_render([{**project(d), "id": str(d["_id"])} for d in bson.decode_all(wire)]),
+            n // 4,
+        )
+        new = bench("decode dicts + orjson", lambda: join_array(_entry(d)[3] for d in bson.decode_all(wire)), n // 4)
+        bench(
+            "RawBSONDocument + orjson",
+            lambda: join_array(_entry(d)[3] for d in bson.decode_all(wire, RAW_BSON)),
+            n // 4,
+        )
+        print(f"{'speedup (dicts + orjson)':<44} {base / new:10.1f}x")
+
+    print(f"-- /challenges, {args.catalog} challenges")
+    catalog = challenges(args.catalog)
+    index = ChallengeIndex(catalog)
+    base = bench("default", lambda: default_render(catalog), max(1, n // 20))
+    new = bench("pre-serialized index.body", lambda: index.body, n)
+    print(f"{'speedup':<44} {base / new:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
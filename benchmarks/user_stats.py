@@ -0,0 +1,88 @@
+"""
+/user/{id}/stats: $facet aggregation vs pulling reflections into Python.
+
+    python benchmarks/user_stats.py --reflections 10000 50000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from _common import BENCH_DATABASE_NAME, BENCH_DATABASE_URL, report
+
+from indexes import ensure_indexes
+from stats import user_stats
+
+USER = "heavy-user"
+
+
+async def seed(adb, n: int):
+    await adb["reflection"].drop()
+    await ensure_indexes(adb)
+    rng = random.Random(n)
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    docs = []
+    for i in range(n):
+        before = rng.randint(1, 5)
+        docs.append({
+            "user_id": USER,
+            "challenge_id": f"c{rng.randint(1, 50)}",
+            "mood_before": before,
+            "mood_after": rng.randint(before, 5),
+            "note": "x" * 120,
+            "is_public": False,
+            "created_at": start + timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+        })
+    # Noise from other users so the $match has something to skip
+    docs += [{**d, "user_id": f"other-{i % 100}"} for i, d in enumerate(docs[: n // 2])]
+    for i in range(0, len(docs), 10_000):
+        await adb["reflection"].insert_many(docs[i:i + 10_000])
+
+
+async def python_stats(adb, user_id: str):
+    """The pull-everything approach the pipeline replaces"""
+    deltas, weeks, per_challenge = Counter(), Counter(), defaultdict(list)
+    async for r in adb["reflection"].find({"user_id": user_id}):
+        delta = r["mood_after"] - r["mood_before"]
+        deltas[delta] += 1
+        year, week, _ = r["created_at"].isocalendar()
+        weeks[f"{year}-W{week:02d}"] += 1
+        per_challenge[r["challenge_id"]].append(delta)
+    return deltas, weeks, {k: sum(v) / len(v) for k, v in per_challenge.items()}
+
+
+async def timed(fn, runs: int):
+    latencies = []
+    start_all = time.perf_counter()
+    for _ in range(runs):
+        start = time.perf_counter()
+        await fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies, time.perf_counter() - start_all
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reflections", type=int, nargs="+", default=[10_000, 50_000])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(BENCH_DATABASE_URL)
+    adb = client[BENCH_DATABASE_NAME]
+    for n in args.reflections:
+        await seed(adb, n)
+        lat, elapsed = await timed(lambda: python_stats(adb, USER), args.runs)
+        report(f"python loop  n={n}", lat, elapsed)
+        lat, elapsed = await timed(lambda: user_stats(adb, USER), args.runs)
+        report(f"$facet       n={n}", lat, elapsed)
+    await client.drop_database(BENCH_DATABASE_NAME)
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+"""
+/reflect insert path: insert_one vs the write-behind buffer, plus a
+crash-recovery check.
+
+latency   times N sequential inserts each way (fsync on and off)
+crash     a child process queues N reflections and dies with os._exit
+          before any flush; the parent then recovers the spill directory
+          and checks that every acknowledged _id is in MongoDB
+
+    python benchmarks/write_behind.py latency --n 5000
+    python benchmarks/write_behind.py crash --n 10000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from _common import BENCH_DATABASE_NAME, BENCH_DATABASE_URL, Timer, report
+
+from database import new_document
+from writebehind import WriteBehindBuffer
+
+COLLECTION = "reflection_wb_bench"
+
+
+def reflection(i: int) -> dict:
+    return new_document({
+        "user_id": f"u{i % 100}",
+        "challenge_id": f"c{i % 20}",
+        "mood_before": 2,
+        "mood_after": 4,
+        "note": "evening check-in",
+        "is_public": False,
+    })
+
+
+def buffer(spill_dir: str, fsync: bool = True) -> WriteBehindBuffer:
+    return WriteBehindBuffer(COLLECTION, spill_dir, flush_ms=50, batch_size=500, max_queue=1_000_000, fsync=fsync)
+
+
+async def latency(adb, n: int):
+    await adb[COLLECTION].drop()
+    latencies = []
+    with Timer() as t:
+        for i in range(n):
+            start = time.perf_counter()
+            await adb[COLLECTION].insert_one(reflection(i))
+            latencies.append(time.perf_counter() - start)
+    report("insert_one", latencies, t.elapsed)
+
+    for fsync in (True, False):
+        await adb[COLLECTION].drop()
+        with tempfile.TemporaryDirectory() as spill:
+            writer = buffer(spill, fsync)
+            writer.open()
+            runner = asyncio.create_task(writer.run(adb))
+            latencies = []
+            with Timer() as t:
+                for i in range(n):
+                    start = time.perf_counter()
+                    await writer.submit(reflection(i))
+                    latencies.append(time.perf_counter() - start)
+            report(f"write-behind submit fsync={fsync}", latencies, t.elapsed)
+            runner.cancel()
+            with Timer() as drain:
+                await writer.close(adb)
+            stored = await adb[COLLECTION].count_documents({})
+            print(f"  drained in {drain.elapsed * 1000:.1f}ms, stored={stored}/{n}")
+
+
+async def crash_child(spill: str, n: int, ids_path: str):
+    writer = buffer(spill)
+    writer.open()
+    acknowledged = []
+    for i in range(n):
+        doc = reflection(i)
+        if await writer.submit(doc):
+            acknowledged.append(str(doc["_id"]))
+    with open(ids_path, "w") as f:
+        json.dump(acknowledged, f)
+    os._exit(1)  # no flush, no close: simulated crash
+
+
+async def crash(adb, n: int):
+    await adb[COLLECTION].drop()
+    with tempfile.TemporaryDirectory() as spill:
+        ids_path = os.path.join(spill, "acknowledged.json")
+        subprocess.run([sys.executable, __file__, "_child", "--n", str(n), "--spill", spill, "--ids", ids_path])
+        with open(ids_path) as f:
+            acknowledged = json.load(f)
+        print(f"child acknowledged {len(acknowledged)} reflections, then crashed")
+
+        writer = buffer(spill)
+        writer.open()
+        with Timer() as t:
+            recovered = await writer.recover(adb)
+        await writer.close(adb)
+        stored = {str(d["_id"]) for d in await adb[COLLECTION].find({}, {"_id": 1}).to_list(None)}
+        missing = [i for i in acknowledged if i not in stored]
+        print(f"recovered {recovered} in {t.elapsed * 1000:.1f}ms; missing {len(missing)}")
+        assert not missing, "acknowledged reflections lost"
+
+        # Recovering the same segments twice must not duplicate anything
+        again = await writer.recover(adb)
+        print(f"second recovery replayed {again}; stored={await adb[COLLECTION].count_documents({})}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mode", choices=["latency", "crash", "_child"])
+    parser.add_argument("--n", type=int, default=5000)
+    parser.add_argument("--spill")
+    parser.add_argument("--ids")
+    args = parser.parse_args()
+
+    if args.mode == "_child":
+        await crash_child(args.spill, args.n, args.ids)
+        return
+
+    client = AsyncIOMotorClient(BENCH_DATABASE_URL)
+    adb = client[BENCH_DATABASE_NAME]
+    if args.mode == "latency":
+        await latency(adb, args.n)
+    else:
+        await crash(adb, args.n)
+    await client.drop_database(BENCH_DATABASE_NAME)
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
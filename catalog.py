@@ -0,0 +1,206 @@
+"""
+Challenge catalog engine
+
+Answers ChallengeFilter queries without scanning the catalog. Challenges
+are numbered by catalog position; every `mood` and `environment` value has
+a bitset (a Python int) of the positions that carry it, and confidence is
+covered by a sorted array of distinct values with prefix bitsets, so a
+confidence range is two bisects and an XOR. A query is an AND of at most
+three ints, and the n-th match is located by binary search on popcounts.
+
+The built index is immutable; `ChallengeCatalog.reload` builds a new one
+and swaps it in with a single assignment, so readers never see a partial
+catalog. `ChallengeCatalog.follow` keeps the snapshot in step with the
+`challenge` collection through a change stream, or by polling
+`updated_at` where change streams are unavailable (standalone mongod), so
+the request path never touches the database. Rebuilds run in a worker
+thread, so the event loop keeps serving from the old snapshot meanwhile.
+"""
+
+import asyncio
+import hashlib
+import logging
+from bisect import bisect_left, bisect_right
+from typing import Dict, Hashable, List, Optional, Sequence
+
+from pydantic import ValidationError
+from pymongo.errors import OperationFailure, PyMongoError
+
+from schemas import Challenge
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "challenge"
+# Only what the Challenge model keeps; timestamps stay on the server
+_PROJECTION = {field: 1 for field in Challenge.model_fields}
+
+
+def _bitsets(values: Sequence[Hashable]) -> Dict[Hashable, int]:
+    """Bitset per distinct value, bit i set where values[i] is that value
+
+    Bits are set in a bytearray and converted once; OR-ing `1 << pos` into
+    an int copies the whole int each time, quadratic in catalog size.
+    """
+    size = (len(values) + 7) // 8
+    bits: Dict[Hashable, bytearray] = {}
+    for pos, value in enumerate(values):
+        buf = bits.get(value)
+        if buf is None:
+            buf = bits[value] = bytearray(size)
+        buf[pos >> 3] |= 1 << (pos & 7)
+    return {value: int.from_bytes(buf, "little") for value, buf in bits.items()}
+
+
+class ChallengeIndex:
+    """Immutable bitset index over a list of challenge dicts"""
+
+    def __init__(self, challenges: Sequence[dict]):
+        self.challenges: List[dict] = list(challenges)
+        # /challenges serves these bytes as-is; the ETag is their digest
+        self.body = dumps(self.challenges)
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+        self.all_mask = (1 << len(self.challenges)) - 1
+        self.by_id: Dict[str, dict] = {str(c.get("_id")): c for c in self.challenges}
+
+        self.by_mood: Dict[str, int] = _bitsets([c.get("mood") for c in self.challenges])
+        self.by_environment: Dict[str, int] = _bitsets([c.get("environment") for c in self.challenges])
+        by_confidence: Dict[int, int] = _bitsets([c.get("confidence", 0) for c in self.challenges])
+
+        # confidence_values[i] is the i-th smallest confidence; confidence_prefix[i]
+        # is the union of all challenges with confidence < confidence_values[i]
+        self.confidence_values: List[int] = sorted(by_confidence)
+        self.confidence_prefix: List[int] = [0]
+        for value in self.confidence_values:
+            self.confidence_prefix.append(self.confidence_prefix[-1] | by_confidence[value])
+
+    def __len__(self) -> int:
+        return len(self.challenges)
+
+    def _confidence_mask(self, lo: Optional[int], hi: Optional[int]) -> int:
+        start = 0 if lo is None else bisect_left(self.confidence_values, lo)
+        end = len(self.confidence_values) if hi is None else bisect_right(self.confidence_values, hi)
+        if start >= end:
+            return 0
+        return self.confidence_prefix[end] ^ self.confidence_prefix[start]
+
+    def match(
+        self,
+        mood: Optional[str] = None,
+        environment: Optional[str] = None,
+        confidence_min: Optional[int] = None,
+        confidence_max: Optional[int] = None,
+    ) -> int:
+        """Bitset of the challenges that satisfy every given filter"""
+        mask = self.all_mask
+        if mood:
+            mask &= self.by_mood.get(mood, 0)
+        if environment:
+            mask &= self.by_environment.get(environment, 0)
+        if confidence_min is not None or confidence_max is not None:
+            mask &= self._confidence_mask(confidence_min, confidence_max)
+        return mask
+
+    def nth(self, mask: int, n: int) -> dict:
+        """The n-th (0-based, catalog order) challenge in `mask`"""
+        # Smallest position p such that mask has n+1 set bits below p+1
+        lo, hi = 0, mask.bit_length()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if (mask & ((1 << (mid + 1)) - 1)).bit_count() > n:
+                hi = mid
+            else:
+                lo = mid + 1
+        return self.challenges[lo]
+
+
+class ChallengeCatalog:
+    """Holder for the current ChallengeIndex with an atomic reload hook"""
+
+    def __init__(self, challenges: Sequence[dict] = ()):
+        # Served whenever the collection is empty or unreachable at startup
+        self.fallback = list(challenges)
+        self._index = ChallengeIndex(challenges)
+
+    @property
+    def index(self) -> ChallengeIndex:
+        return self._index
+
+    @property
+    def challenges(self) -> List[dict]:
+        return self._index.challenges
+
+    @property
+    def etag(self) -> str:
+        return self._index.etag
+
+    def get(self, challenge_id: str) -> Optional[dict]:
+        return self._index.by_id.get(challenge_id)
+
+    def reload(self, challenges: Sequence[dict]) -> None:
+        """Rebuild the index from a fresh challenge list and swap it in"""
+        self._index = ChallengeIndex(challenges)
+
+    def pick(self, rotation: int, **filters) -> Optional[dict]:
+        """Deterministically pick one matching challenge, or None if nothing matches"""
+        index = self._index  # one snapshot for the whole lookup
+        mask = index.match(**filters)
+        count = mask.bit_count()
+        if not count:
+            return None
+        return index.nth(mask, rotation % count)
+
+    def _build(self, docs: List[dict]) -> ChallengeIndex:
+        challenges = []
+        for doc in docs:
+            try:
+                fields = Challenge(**doc).model_dump()
+            except ValidationError as e:
+                logger.warning("Skipping invalid challenge %s: %s", doc.get("_id"), e)
+                continue
+            challenges.append({"_id": str(doc["_id"]), **fields})
+        return ChallengeIndex(challenges or self.fallback)
+
+    async def load_from(self, adb) -> None:
+        """Replace the snapshot with the contents of the challenge collection"""
+        docs = await adb[COLLECTION].find({}, _PROJECTION).sort("_id", 1).to_list(None)
+        # Validation, serialization and the bitsets are CPU-bound; keep them
+        # off the event loop so a catalog change does not stall requests
+        self._index = await asyncio.to_thread(self._build, docs)
+
+    async def follow(self, adb, poll_seconds: float = 30.0) -> None:
+        """Keep the snapshot current until cancelled"""
+        while True:
+            try:
+                await self._watch(adb)
+            except OperationFailure as e:
+                # Change streams need a replica set; fall back to polling
+                logger.info("Challenge change stream unavailable (%s); polling every %ss", e, poll_seconds)
+                await self._poll(adb, poll_seconds)
+            except PyMongoError as e:
+                logger.warning("Challenge change stream interrupted: %s", e)
+                await asyncio.sleep(poll_seconds)
+
+    async def _watch(self, adb) -> None:
+        async with adb[COLLECTION].watch() as stream:
+            # Reload after opening the stream so nothing between the two is missed
+            await self.load_from(adb)
+            async for _ in stream:
+                # Coalesce bursts (bulk imports) into a single rebuild
+                while await stream.try_next() is not None:
+                    pass
+                await self.load_from(adb)
+
+    async def _poll(self, adb, poll_seconds: float) -> None:
+        seen = None
+        while True:
+            try:
+                latest = await adb[COLLECTION].find({}, {"updated_at": 1}).sort("updated_at", -1).limit(1).to_list(1)
+                count = await adb[COLLECTION].estimated_document_count()
+                marker = (latest[0].get("updated_at") if latest else None, count)
+                if marker != seen:
+                    await self.load_from(adb)
+                    seen = marker
+            except PyMongoError as e:
+                logger.warning("Challenge catalog poll failed: %s", e)
+            await asyncio.sleep(poll_seconds)
@@ -3,53 +3,347 @@ Database Helper Functions
 
 MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
+
+Importing this module has no side effects: .env is read and clients are
+created on first use (get_db / get_async_db). `from database import db`
+still works and connects lazily.
 """
 
-from pymongo import MongoClient
+from bson import ObjectId
+from pymongo import MongoClient, ReturnDocument, common, monitoring
 from datetime import datetime, timezone
 import os
+import threading
 from dotenv import load_dotenv
-from typing import Union
+from typing import List, Optional, Tuple, Union
 from pydantic import BaseModel
 
-# Load environment variables from .env file
-load_dotenv()
+import metrics
+import slowlog
 
 _client = None
-db = None
+_db = None
+_async_client = None
+_async_db = None
+_config: Optional[Tuple[Optional[str], Optional[str]]] = None
+
+
+def _database_config():
+    """(DATABASE_URL, DATABASE_NAME), loading the .env file on first call"""
+    global _config
+    if _config is None:
+        # Load environment variables from .env file
+        load_dotenv()
+        _config = (os.getenv("DATABASE_URL"), os.getenv("DATABASE_NAME"))
+    return _config
+
+
+# Connection pool settings, all optional:
+#   MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS,
+#   MONGO_WAIT_QUEUE_TIMEOUT_MS, MONGO_COMPRESSORS (e.g. "zstd,snappy,zlib")
+_POOL_ENV = {
+    "maxPoolSize": ("MONGO_MAX_POOL_SIZE", int),
+    "minPoolSize": ("MONGO_MIN_POOL_SIZE", int),
+    "maxIdleTimeMS": ("MONGO_MAX_IDLE_TIME_MS", int),
+    "waitQueueTimeoutMS": ("MONGO_WAIT_QUEUE_TIMEOUT_MS", int),
+    "compressors": ("MONGO_COMPRESSORS", str),
+}
+
+def client_options() -> dict:
+    """MongoClient keyword arguments taken from the environment"""
+    options = {}
+    for option, (env, cast) in _POOL_ENV.items():
+        value = os.getenv(env)
+        if value:
+            options[option] = cast(value)
+    return options
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Tracks connection pool usage for the async client (summed over servers)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.max_pool_size = None
+        self.open = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_queue_timeouts = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_pool_size": self.max_pool_size,
+                "open": self.open,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "saturation": round(self.in_use / self.max_pool_size, 4) if self.max_pool_size else None,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "wait_queue_timeouts": self.wait_queue_timeouts,
+            }
+
+    def pool_created(self, event):
+        with self._lock:
+            # Only non-default options are reported
+            self.max_pool_size = event.options.get("maxPoolSize", common.MAX_POOL_SIZE)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
 
-database_url = os.getenv("DATABASE_URL")
-database_name = os.getenv("DATABASE_NAME")
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
 
-if database_url and database_name:
-    _client = MongoClient(database_url)
-    db = _client[database_name]
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.wait_queue_timeouts += 1
+
+    # Required by the listener interface; nothing to record
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+
+pool_monitor = PoolMonitor()
+
+def get_db():
+    """Synchronous database handle for scripts and CLIs, or None when unconfigured"""
+    global _client, _db
+    if _db is None:
+        database_url, database_name = _database_config()
+        if database_url and database_name:
+            _client = MongoClient(database_url, **client_options())
+            _db = _client[database_name]
+    return _db
+
+def get_async_db():
+    """Async database handle used by the app, or None when unconfigured
+
+    The client is created on first call, which should happen inside the
+    serving process (after any fork), not at import.
+    """
+    global _async_client, _async_db
+    if _async_db is None:
+        database_url, database_name = _database_config()
+        if database_url and database_name:
+            from motor.motor_asyncio import AsyncIOMotorClient  # deferred: keeps imports cheap
+
+            _async_client = AsyncIOMotorClient(database_url, event_listeners=[pool_monitor, metrics.command_timer, slowlog.slow_queries], **client_options())
+            _async_db = _async_client[database_name]
+    return _async_db
+
+def close():
+    """Close clients and release their pooled connections (call from app shutdown)"""
+    global _client, _db, _async_client, _async_db
+    if _async_client is not None:
+        _async_client.close()
+        _async_client, _async_db = None, None
+    if _client is not None:
+        _client.close()
+        _client, _db = None, None
+
+def __getattr__(name):
+    # Lazy module attributes for `from database import db` style callers
+    if name == "db":
+        return get_db()
+    if name == "async_db":
+        return get_async_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
-    if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+def bson_time(value: datetime) -> datetime:
+    """`value` at the millisecond precision BSON dates store"""
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+def _prepare_document(data: Union[BaseModel, dict]) -> dict:
+    """Convert a Pydantic model or dict into a timestamped document
 
-    # Convert Pydantic model to dict if needed
+    A `created_at` already present in a dict is kept (e.g. replayed offline
+    submissions); `updated_at` is always the write time. Both are truncated
+    to milliseconds, so the document held in memory (gallery buffer, write
+    behind) has the same timestamps as the stored one.
+    """
     if isinstance(data, BaseModel):
         data_dict = data.model_dump()
     else:
         data_dict = data.copy()
 
-    data_dict['created_at'] = datetime.now(timezone.utc)
-    data_dict['updated_at'] = datetime.now(timezone.utc)
+    now = bson_time(datetime.now(timezone.utc))
+    if data_dict.get('created_at') is None:
+        data_dict['created_at'] = now
+    elif isinstance(data_dict['created_at'], datetime):
+        data_dict['created_at'] = bson_time(data_dict['created_at'])
+    data_dict['updated_at'] = now
+    return data_dict
 
-    result = db[collection_name].insert_one(data_dict)
-    return str(result.inserted_id)
+def new_document(data: Union[BaseModel, dict]) -> dict:
+    """Timestamped document with a client-generated _id, ready to insert later"""
+    data_dict = _prepare_document(data)
+    data_dict.setdefault('_id', ObjectId())
+    return data_dict
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+def _require_db():
+    db = get_db()
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    
-    cursor = db[collection_name].find(filter_dict or {})
+    return db
+
+def create_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp"""
+    db = _require_db()
+
+    result = db[collection_name].insert_one(_prepare_document(data))
+    return str(result.inserted_id)
+
+Sort = List[Tuple[str, int]]
+
+def sort_key(doc: dict, sort: Sort) -> tuple:
+    """Values of the sort fields of `doc`, to pass back as `after`"""
+    return tuple(doc.get(field) for field, _ in sort)
+
+def keyset_filter(sort: Sort, after: tuple) -> dict:
+    """Match documents strictly past `after` in `sort` order
+
+    For sort [(a, 1), (b, -1)] and after (x, y) this is
+    {$or: [{a: {$gt: x}}, {a: x, b: {$lt: y}}]}. Include a unique field
+    (usually _id) last so ties cannot repeat or skip documents.
+    """
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        branch = {f: after[j] for j, (f, _) in enumerate(sort[:i])}
+        branch[field] = {"$gt" if direction == 1 else "$lt": after[i]}
+        branches.append(branch)
+    return branches[0] if len(branches) == 1 else {"$or": branches}
+
+def iter_documents(
+    collection_name: str,
+    filter_dict: dict = None,
+    projection: dict = None,
+    sort: Sort = None,
+    limit: int = None,
+    batch_size: int = None,
+    after: tuple = None,
+):
+    """Yield matching documents one at a time straight off the cursor
+
+    Memory stays at one cursor batch however large the result. `after`
+    resumes a keyset-paginated walk: pass sort_key() of the last document
+    seen, with the same `sort`.
+    """
+    db = _require_db()
+    query = filter_dict or {}
+    if after is not None:
+        if not sort:
+            raise ValueError("keyset pagination (after) needs a sort")
+        keyset = keyset_filter(sort, after)
+        query = {"$and": [query, keyset]} if query else keyset
+
+    cursor = db[collection_name].find(query, projection)
+    if sort:
+        cursor = cursor.sort(sort)
     if limit:
         cursor = cursor.limit(limit)
-    
-    return list(cursor)
+    if batch_size:
+        cursor = cursor.batch_size(batch_size)
+    with cursor:
+        yield from cursor
+
+def find_document(collection_name: str, filter_dict: dict, projection: dict = None, sort: Sort = None):
+    """Get the first matching document or None"""
+    db = _require_db()
+    return db[collection_name].find_one(filter_dict, projection, sort=sort)
+
+def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None):
+    """Get documents from collection as a list (prefer iter_documents for large results)"""
+    return list(iter_documents(collection_name, filter_dict, projection=projection, limit=limit))
+
+def update_document(collection_name: str, filter_dict: dict, update_data: dict):
+    """Set fields on the first matching document and bump updated_at"""
+    db = _require_db()
+    fields = {**update_data, 'updated_at': datetime.now(timezone.utc)}
+    result = db[collection_name].update_one(filter_dict, {"$set": fields})
+    return result.modified_count > 0
+
+def delete_document(collection_name: str, filter_dict: dict):
+    """Delete the first matching document"""
+    db = _require_db()
+    result = db[collection_name].delete_one(filter_dict)
+    return result.deleted_count > 0
+
+
+# Async (Motor) counterparts for use inside `async def` endpoints
+def _require_async_db():
+    adb = get_async_db()
+    if adb is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    return adb
+
+async def insert_document_async(collection_name: str, data: Union[BaseModel, dict]) -> dict:
+    """Insert a single document with timestamp and return the stored document (async)"""
+    adb = _require_async_db()
+    data_dict = _prepare_document(data)
+    await adb[collection_name].insert_one(data_dict)  # sets data_dict["_id"]
+    return data_dict
+
+async def upsert_document_async(collection_name: str, data: Union[BaseModel, dict]) -> bool:
+    """Insert a document that carries its own _id unless it is already stored; True if inserted (async)"""
+    adb = _require_async_db()
+    data_dict = _prepare_document(data)
+    _id = data_dict.pop('_id')
+    result = await adb[collection_name].update_one({'_id': _id}, {'$setOnInsert': data_dict}, upsert=True)
+    return result.upserted_id is not None
+
+async def insert_documents_async(collection_name: str, items: List[Union[BaseModel, dict]]) -> List[dict]:
+    """Insert many documents in one round trip and return them with their _ids (async)"""
+    adb = _require_async_db()
+    docs = [_prepare_document(item) for item in items]
+    if docs:
+        await adb[collection_name].insert_many(docs)  # sets each doc's "_id"
+    return docs
+
+async def get_documents_async(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None):
+    """Get documents from collection, optionally only the `projection` fields (async)"""
+    adb = _require_async_db()
+    cursor = adb[collection_name].find(filter_dict or {}, projection)
+    if limit:
+        cursor = cursor.limit(limit)
+    return await cursor.to_list(length=limit)
+
+async def find_one_async(collection_name: str, filter_dict: dict, projection: dict = None):
+    """Get a single document or None, optionally only the `projection` fields (async)"""
+    adb = _require_async_db()
+    return await adb[collection_name].find_one(filter_dict, projection)
+
+async def update_one_async(collection_name: str, filter_dict: dict, update: dict):
+    """Apply an update to the first matching document, return matched count (async)"""
+    adb = _require_async_db()
+    result = await adb[collection_name].update_one(filter_dict, update)
+    return result.matched_count
+
+async def find_one_and_update_async(collection_name: str, filter_dict: dict, update, projection: dict = None):
+    """Atomically update one document and return it as it is after the update, or None (async)"""
+    adb = _require_async_db()
+    return await adb[collection_name].find_one_and_update(
+        filter_dict, update, projection=projection, return_document=ReturnDocument.AFTER
+    )
@@ -0,0 +1,80 @@
+"""
+Reflection export
+
+Streams one user's reflections straight off a Motor cursor as NDJSON or
+CSV. Memory is bounded by one cursor batch: documents are encoded as they
+arrive and handed to the response in chunks of `batch_size` rows, so an
+export of a million reflections holds no more than an export of ten.
+
+created_at is exported as ISO 8601 with a UTC offset in both formats;
+PyMongo returns it naive, so it is marked UTC before formatting.
+"""
+
+import csv
+import io
+from datetime import datetime, timezone
+from typing import AsyncIterator, Iterable
+
+from serialization import dumps
+
+FIELDS = ["id", "challenge_id", "mood_before", "mood_after", "note", "is_public", "created_at"]
+
+_PROJECTION = {"challenge_id": 1, "mood_before": 1, "mood_after": 1, "note": 1, "is_public": 1, "created_at": 1}
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def row(doc: dict) -> dict:
+    """Export fields of a stored reflection; created_at stays a datetime"""
+    return {
+        "id": str(doc["_id"]),
+        "challenge_id": doc.get("challenge_id"),
+        "mood_before": doc.get("mood_before"),
+        "mood_after": doc.get("mood_after"),
+        "note": doc.get("note"),
+        "is_public": doc.get("is_public", False),
+        "created_at": doc.get("created_at"),
+    }
+
+
+def ndjson_chunk(rows: Iterable[dict]) -> bytes:
+    # dumps encodes naive datetimes as UTC (OPT_NAIVE_UTC)
+    return b"".join(dumps(r) + b"\n" for r in rows)
+
+
+def _csv_row(r: dict) -> dict:
+    created = r["created_at"]
+    if not isinstance(created, datetime):
+        return r
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return {**r, "created_at": created.isoformat()}
+
+
+def csv_chunk(rows: Iterable[dict], header: bool = False) -> bytes:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=FIELDS)
+    if header:
+        writer.writeheader()
+    writer.writerows(map(_csv_row, rows))
+    return buf.getvalue().encode()
+
+
+async def stream_reflections(adb, user_id: str, fmt: str = "ndjson", batch_size: int = 1000) -> AsyncIterator[bytes]:
+    """Encoded export chunks, oldest reflection first"""
+    cursor = (
+        adb["reflection"].find({"user_id": user_id}, _PROJECTION)
+        .sort("created_at", 1)
+        .batch_size(batch_size)
+    )
+    encode = csv_chunk if fmt == "csv" else ndjson_chunk
+    if fmt == "csv":
+        yield csv_chunk((), header=True)
+    pending = []
+    async for doc in cursor:
+        pending.append(row(doc))
+        if len(pending) >= batch_size:
+            yield encode(pending)
+            pending = []
+    if pending:
+        yield encode(pending)
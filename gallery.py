@@ -0,0 +1,191 @@
+"""
+Joy Gallery read model
+
+Keeps the newest public reflections in an in-process ring buffer, already
+projected to the shape /gallery returns and encoded to JSON, so the most
+polled endpoint neither queries MongoDB nor serializes on every hit. The
+buffer is filled from Mongo on cold start, fed by /reflect, and re-synced
+every GALLERY_REFRESH_SECONDS so writes made by other workers show up.
+Pages that reach past the buffer fall through to a keyset query on
+(created_at, _id).
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from database import bson_time
+from serialization import dumps, join_array
+
+GALLERY_FILTER = {"is_public": True}
+GALLERY_SORT = [("created_at", -1), ("_id", -1)]
+MAX_PAGE_SIZE = 50
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _as_utc(value):
+    # PyMongo hands back naive UTC datetimes unless tz_aware=True
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+# Exactly the fields project() reads
+GALLERY_PROJECTION = {"challenge_id": 1, "note": 1, "mood_after": 1, "created_at": 1}
+
+
+def project(doc: dict) -> dict:
+    """Project a stored reflection to the public gallery shape"""
+    return {
+        "id": doc.get("_id"),
+        "challenge_id": doc.get("challenge_id"),
+        "note": doc.get("note"),
+        "mood_after": doc.get("mood_after"),
+        "created_at": _as_utc(doc.get("created_at")),
+    }
+
+
+def _entry(doc) -> tuple:
+    item = project(doc)
+    return (item["created_at"], item["id"], item, dumps(item))
+
+
+def encode_cursor(item: dict) -> str:
+    """Build the `before` cursor that continues after `item`
+
+    created_at is written as epoch milliseconds (the precision MongoDB
+    stores), which keeps the cursor URL-safe as well as exact.
+    """
+    millis = (item["created_at"] - _EPOCH) // timedelta(milliseconds=1)
+    return f"{millis},{item['id']}"
+
+
+def decode_cursor(before: str) -> Tuple[datetime, object]:
+    """Parse a `<created_at>,<id>` cursor; raises ValueError when malformed
+
+    created_at is epoch milliseconds; ISO 8601 cursors issued before that
+    change are still accepted.
+    """
+    created_at, _, raw_id = before.rpartition(",")
+    if not created_at or not raw_id:
+        raise ValueError("cursor must be '<created_at>,<id>'")
+    if created_at.isdigit():
+        try:
+            ts = _EPOCH + timedelta(milliseconds=int(created_at))
+        except OverflowError:
+            raise ValueError("cursor timestamp out of range") from None
+    else:
+        # A "+00:00" pasted into a query string arrives as " 00:00"
+        ts = _as_utc(datetime.fromisoformat(created_at.replace(" ", "+")))
+    ts = bson_time(ts)
+    try:
+        doc_id = ObjectId(raw_id)
+    except (InvalidId, TypeError):
+        doc_id = raw_id
+    return ts, doc_id
+
+
+def keyset_filter(before: Tuple[datetime, object]) -> dict:
+    ts, doc_id = before
+    return {
+        **GALLERY_FILTER,
+        "$or": [
+            {"created_at": {"$lt": ts}},
+            {"created_at": ts, "_id": {"$lt": doc_id}},
+        ],
+    }
+
+
+class GalleryFeed:
+    """Ring buffer of the newest public reflections, newest first"""
+
+    def __init__(self, capacity: int = 200, refresh_seconds: float = 5.0):
+        self.capacity = capacity
+        self.refresh_seconds = refresh_seconds
+        # Entries are (created_at, _id, projected item, encoded item), newest first
+        self._entries: deque = deque(maxlen=capacity)
+        # True when the buffer holds every public reflection there is
+        self._complete = False
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    async def load(self, adb) -> None:
+        """(Re)fill the buffer from MongoDB"""
+        docs = await adb["reflection"].find(GALLERY_FILTER, GALLERY_PROJECTION).sort(GALLERY_SORT).limit(self.capacity).to_list(
+            length=self.capacity
+        )
+        self._entries = deque((_entry(d) for d in docs), maxlen=self.capacity)
+        self._complete = len(docs) < self.capacity
+        self._loaded_at = time.monotonic()
+
+    async def _ensure_fresh(self, adb) -> None:
+        if not self._stale():
+            return
+        async with self._lock:
+            if self._stale():
+                await self.load(adb)
+
+    def add(self, doc: dict) -> None:
+        """Record a freshly stored reflection (no-op for private ones)"""
+        if not doc.get("is_public"):
+            return
+        entry = _entry(doc)
+        if not self._entries or self._key(self._entries[0]) <= self._key(entry):
+            if len(self._entries) == self.capacity:
+                self._complete = False
+            self._entries.appendleft(entry)
+        # Out-of-order arrivals are rare (clock skew between writers);
+        # the next refresh picks them up from Mongo.
+
+    @staticmethod
+    def _key(entry) -> tuple:
+        return (entry[0], str(entry[1]))
+
+    def _from_buffer(self, limit: int, before: Optional[Tuple[datetime, object]]) -> Optional[List[tuple]]:
+        entries = self._entries
+        start = 0
+        if before is not None:
+            bkey = (before[0], str(before[1]))
+            while start < len(entries) and self._key(entries[start]) >= bkey:
+                start += 1
+            if start == len(entries) and not self._complete:
+                return None
+        end = start + limit
+        if end > len(entries) and not self._complete:
+            return None
+        return [entries[i] for i in range(start, min(end, len(entries)))]
+
+    async def _page_entries(self, adb, limit: int, before: Optional[str]) -> List[tuple]:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        keyset = decode_cursor(before) if before else None
+
+        await self._ensure_fresh(adb)
+        entries = self._from_buffer(limit, keyset)
+        if entries is not None:
+            return entries
+
+        # Deep page: keyset query straight against Mongo
+        query = keyset_filter(keyset) if keyset else GALLERY_FILTER
+        docs = await adb["reflection"].find(query, GALLERY_PROJECTION).sort(GALLERY_SORT).limit(limit).to_list(length=limit)
+        return [_entry(d) for d in docs]
+
+    async def page_json(self, adb, limit: int = 20, before: Optional[str] = None) -> Tuple[bytes, Optional[str]]:
+        """Up to `limit` items older than the `before` cursor as a JSON array, plus the next cursor (None when empty)"""
+        entries = await self._page_entries(adb, limit, before)
+        next_cursor = encode_cursor(entries[-1][2]) if entries else None
+        return join_array(entry[3] for entry in entries), next_cursor
+
+
+gallery_feed = GalleryFeed(
+    capacity=int(os.getenv("GALLERY_BUFFER_SIZE", 200)),
+    refresh_seconds=float(os.getenv("GALLERY_REFRESH_SECONDS", 5)),
+)
@@ -0,0 +1,182 @@
+"""
+Group challenges
+
+Built for groups with tens of thousands of members, so no code path reads
+or rewrites a whole member list:
+
+- `group` documents carry a member_count instead of a member array; join
+  codes are allocated and resolved to a group_id by joincodes.py.
+- Membership is one `groupmember` document per (group, user) with
+  _id "<group_id>:<user_id>", so joining is a single idempotent insert and
+  the user_id index is the member -> groups reverse index.
+- Setting a group challenge fans out to every member with one
+  update_many on the group_id index instead of a per-member loop.
+- The group feed only covers reflections made since the challenge was
+  assigned. Small groups (up to GROUP_FEED_SMALL_GROUP members) read their
+  member ids and query reflections by user_id; large ones walk the
+  challenge's reflections newest first and keep members' ones through an
+  _id-indexed $lookup.
+"""
+
+import os
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import ids
+from database import insert_document_async
+from schemas import Group, GroupMember
+
+GROUP = "group"
+MEMBER = "groupmember"
+
+_GROUP_PROJECTION = {"name": 1, "code": 1, "owner_id": 1, "member_count": 1, "current_challenge_id": 1}
+
+# Up to this many members the feed is driven from the member list
+SMALL_GROUP = int(os.getenv("GROUP_FEED_SMALL_GROUP", 200))
+
+_FEED_ITEM = {"$project": {
+    "_id": 0,
+    "id": {"$toString": "$_id"},
+    "user_id": 1,
+    "challenge_id": 1,
+    "mood_after": 1,
+    # Members see each other's completions, but notes only when public
+    "note": {"$cond": ["$is_public", "$note", None]},
+    "created_at": 1,
+}}
+
+
+def member_key(group_id: str, user_id: str) -> str:
+    return f"{group_id}:{user_id}"
+
+
+def shape_group(doc: dict) -> dict:
+    return {
+        "id": str(doc["_id"]),
+        "name": doc.get("name"),
+        "code": doc.get("code"),
+        "owner_id": doc.get("owner_id"),
+        "member_count": doc.get("member_count", 0),
+        "current_challenge_id": doc.get("current_challenge_id"),
+    }
+
+
+async def _add_member(adb, group: dict, user_id: str) -> bool:
+    """Insert the membership document; False if the user already belongs"""
+    gid = str(group["_id"])
+    member = GroupMember(group_id=gid, user_id=user_id, current_challenge_id=group.get("current_challenge_id"))
+    try:
+        await insert_document_async(MEMBER, {"_id": member_key(gid, user_id), **member.model_dump()})
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def create_group(adb, name: str, owner_id: str, code: str, group_id: Optional[str] = None) -> dict:
+    """Create a group with its owner as first member; DuplicateKeyError if the code is taken"""
+    group = Group(name=name, code=code, owner_id=owner_id, member_count=1)
+    data = {"_id": ObjectId(group_id), **group.model_dump()} if group_id else group
+    doc = await insert_document_async(GROUP, data)
+    await _add_member(adb, doc, owner_id)
+    return shape_group(doc)
+
+
+async def join_group(adb, group_id: str, user_id: str) -> Optional[dict]:
+    """Join a group (resolved from its code); None if the group does not exist"""
+    gid = ids.decode(group_id)
+    group = await adb[GROUP].find_one({"_id": gid}, _GROUP_PROJECTION) if gid else None
+    if group is None:
+        return None
+    if await _add_member(adb, group, user_id):
+        group = await adb[GROUP].find_one_and_update(
+            {"_id": group["_id"]}, {"$inc": {"member_count": 1}},
+            projection=_GROUP_PROJECTION, return_document=ReturnDocument.AFTER,
+        )
+    return shape_group(group)
+
+
+async def groups_for_user(adb, user_id: str) -> List[dict]:
+    memberships = await adb[MEMBER].find({"user_id": user_id}, {"group_id": 1}).to_list(length=None)
+    group_ids = ids.decode_many(m["group_id"] for m in memberships)
+    if not group_ids:
+        return []
+    groups = await adb[GROUP].find({"_id": {"$in": group_ids}}, _GROUP_PROJECTION).to_list(length=None)
+    return [shape_group(g) for g in groups]
+
+
+async def set_group_challenge(adb, group_id: str, user_id: str, challenge_id: str) -> Optional[dict]:
+    """Owner-only; None if the group does not exist, PermissionError for non-owners"""
+    gid = ids.decode(group_id)
+    if gid is None:
+        return None
+    now = datetime.now(timezone.utc)
+    group = await adb[GROUP].find_one_and_update(
+        {"_id": gid, "owner_id": user_id},
+        {"$set": {"current_challenge_id": challenge_id, "challenge_assigned_at": now, "updated_at": now}},
+        projection=_GROUP_PROJECTION, return_document=ReturnDocument.AFTER,
+    )
+    if group is None:
+        if await adb[GROUP].find_one({"_id": gid}, {"_id": 1}) is None:
+            return None
+        raise PermissionError("Only the group owner can set the challenge")
+
+    # Fan-out: one multi-document update, however many members there are
+    result = await adb[MEMBER].update_many(
+        {"group_id": str(gid)},
+        {"$set": {"current_challenge_id": challenge_id, "assigned_at": now, "updated_at": now}},
+    )
+    return {**shape_group(group), "members_notified": result.modified_count}
+
+
+def feed_match(challenge_id: str, assigned_at: Optional[datetime]) -> dict:
+    """Reflections on the group's challenge made since it was assigned"""
+    match = {"challenge_id": challenge_id}
+    if assigned_at is not None:
+        # Groups whose challenge was set before assignment times were kept have no bound
+        match["created_at"] = {"$gte": assigned_at}
+    return match
+
+
+def small_group_feed_pipeline(match: dict, member_ids: List[str], limit: int) -> list:
+    # user_id $in + created_at sort merges the members' user_id index ranges
+    return [
+        {"$match": {"user_id": {"$in": member_ids}, **match}},
+        {"$sort": {"created_at": -1}},
+        {"$limit": limit},
+        _FEED_ITEM,
+    ]
+
+
+def group_feed_pipeline(gid: ObjectId, match: dict, limit: int) -> list:
+    return [
+        {"$match": match},
+        {"$sort": {"created_at": -1}},
+        {"$addFields": {"_member_key": {"$concat": [str(gid), ":", "$user_id"]}}},
+        {"$lookup": {"from": MEMBER, "localField": "_member_key", "foreignField": "_id", "as": "_member"}},
+        {"$match": {"_member": {"$ne": []}}},
+        {"$limit": limit},
+        _FEED_ITEM,
+    ]
+
+
+async def group_feed(adb, group_id: str, limit: int = 20) -> Optional[List[dict]]:
+    """Newest member reflections on the group's current challenge; None if no such group"""
+    gid = ids.decode(group_id)
+    group = await adb[GROUP].find_one(
+        {"_id": gid}, {"current_challenge_id": 1, "challenge_assigned_at": 1, "member_count": 1}
+    ) if gid else None
+    if group is None:
+        return None
+    if not group.get("current_challenge_id"):
+        return []
+    match = feed_match(group["current_challenge_id"], group.get("challenge_assigned_at"))
+    if group.get("member_count", 0) <= SMALL_GROUP:
+        members = await adb[MEMBER].find({"group_id": str(gid)}, {"_id": 0, "user_id": 1}).to_list(length=SMALL_GROUP + 1)
+        if len(members) <= SMALL_GROUP:
+            pipeline = small_group_feed_pipeline(match, [m["user_id"] for m in members], limit)
+            return await adb["reflection"].aggregate(pipeline).to_list(length=limit)
+    return await adb["reflection"].aggregate(group_feed_pipeline(gid, match, limit)).to_list(length=limit)
@@ -0,0 +1,112 @@
+"""
+Health subsystem
+
+A background pinger keeps the result and latency of the last `ping`, plus
+replication lag when running against a replica set, so health probes are
+answered from memory instead of costing a round trip each. The detailed
+report (collection listing, dbStats) does hit the server and is therefore
+rate limited: callers inside the interval get the cached copy.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo.errors import PyMongoError
+
+import database
+
+
+class HealthMonitor:
+    """Periodic MongoDB ping with cached results"""
+
+    def __init__(self, interval: float = 5.0, detail_interval: float = 30.0):
+        self.interval = interval
+        self.detail_interval = detail_interval
+        self.ok = False
+        self.latency_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self.checked_at: Optional[datetime] = None
+        self._checked_mono: Optional[float] = None
+        self.replication_lag_seconds: Optional[float] = None
+        self._detail: Optional[dict] = None
+        self._detail_mono: Optional[float] = None
+        self._detail_lock = asyncio.Lock()
+
+    async def check(self, adb) -> None:
+        """Ping once and record the outcome"""
+        start = time.perf_counter()
+        try:
+            await adb.command("ping")
+            self.latency_ms = round((time.perf_counter() - start) * 1000, 3)
+            self.ok, self.error = True, None
+        except PyMongoError as e:
+            self.ok, self.latency_ms, self.error = False, None, str(e)[:200]
+        self.checked_at = datetime.now(timezone.utc)
+        self._checked_mono = time.monotonic()
+
+        if self.ok:
+            self.replication_lag_seconds = await self._replication_lag(adb)
+
+    @staticmethod
+    async def _replication_lag(adb) -> Optional[float]:
+        """Largest primary-to-secondary optime gap, or None on a standalone"""
+        try:
+            status = await adb.client.admin.command("replSetGetStatus")
+        except PyMongoError:
+            # Standalone server, missing clusterMonitor privileges, or unreachable
+            return None
+        members = status.get("members", [])
+        primary = next((m for m in members if m.get("stateStr") == "PRIMARY"), None)
+        if primary is None:
+            return None
+        secondaries = [m["optimeDate"] for m in members if m.get("stateStr") == "SECONDARY" and "optimeDate" in m]
+        if not secondaries:
+            return 0.0
+        return max((primary["optimeDate"] - s).total_seconds() for s in secondaries)
+
+    async def run(self, adb) -> None:
+        """Ping every `interval` seconds until cancelled"""
+        while True:
+            await self.check(adb)
+            await asyncio.sleep(self.interval)
+
+    @property
+    def fresh(self) -> bool:
+        # Missing three pings in a row means the pinger itself is stuck
+        return self._checked_mono is not None and time.monotonic() - self._checked_mono < 3 * self.interval
+
+    @property
+    def healthy(self) -> bool:
+        return self.ok and self.fresh
+
+    def snapshot(self) -> dict:
+        """Last known state; no I/O"""
+        return {
+            "status": "ok" if self.healthy else "unavailable",
+            "ping_ms": self.latency_ms,
+            "checked_at": self.checked_at,
+            "error": self.error,
+            "replication_lag_seconds": self.replication_lag_seconds,
+            "pool": database.pool_monitor.stats(),
+        }
+
+    async def detailed(self, adb) -> dict:
+        """Server-side details, refreshed at most once per `detail_interval`"""
+        async with self._detail_lock:
+            if self._detail is None or time.monotonic() - self._detail_mono >= self.detail_interval:
+                try:
+                    stats = await adb.command("dbStats")
+                    self._detail = {
+                        "collections": await adb.list_collection_names(),
+                        "objects": stats.get("objects"),
+                        "data_size": stats.get("dataSize"),
+                        "index_size": stats.get("indexSize"),
+                        "error": None,
+                    }
+                except PyMongoError as e:
+                    self._detail = {"collections": [], "error": str(e)[:200]}
+                self._detail["generated_at"] = datetime.now(timezone.utc)
+                self._detail_mono = time.monotonic()
+            return self._detail
@@ -0,0 +1,122 @@
+"""
+Idempotency keys
+
+Clients may send an `Idempotency-Key` header on writes. The first request
+with a key claims it: an `idempotencykey` document (_id = "<scope>:<key>")
+is inserted together with the _id the new resource will get, so even a
+re-executed write targets the same document and becomes an upsert instead
+of a duplicate. When the write finishes its response is stored on the
+record; retries get that response back without touching the write path.
+
+Completed records are also kept in an in-process LRU, so the common retry
+(same worker, seconds later) costs no round trip. Records expire through a
+TTL index on created_at.
+
+A retry that arrives while the first attempt is still running gets
+KeyInUse; one whose first attempt failed or died takes the claim over
+once its lock lapses. Reusing a key with a different payload is KeyReused.
+"""
+
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from bson import ObjectId
+from pydantic import BaseModel
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from cache import TTLCache
+
+COLLECTION = "idempotencykey"
+
+
+class KeyInUse(Exception):
+    """Another request with this key is still being processed"""
+
+
+class KeyReused(Exception):
+    """The key was already used for a different request body"""
+
+
+class Claim:
+    """A claimed key: the resource _id to write and, for replays, the stored response"""
+
+    __slots__ = ("key_id", "fingerprint", "resource_id", "first", "response")
+
+    def __init__(self, key_id: str, fingerprint: str, resource_id: ObjectId, first: bool, response: Optional[dict] = None):
+        self.key_id = key_id
+        self.fingerprint = fingerprint
+        self.resource_id = resource_id
+        # False when an earlier attempt may already have written the resource
+        self.first = first
+        self.response = response
+
+
+def fingerprint(payload: BaseModel) -> str:
+    return hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, ttl: float = 86400.0, cache_size: int = 10_000, lock_seconds: float = 30.0):
+        self.ttl = ttl
+        self.lock_seconds = lock_seconds
+        # key_id -> (fingerprint, resource_id, response) of completed requests
+        self._done = TTLCache(cache_size, ttl)
+
+    async def begin(self, adb, scope: str, key: str, fingerprint: str) -> Claim:
+        key_id = f"{scope}:{key}"
+        done = self._done.get(key_id)
+        if done is not None:
+            if done[0] != fingerprint:
+                raise KeyReused(key)
+            return Claim(key_id, fingerprint, done[1], first=False, response=done[2])
+
+        now = datetime.now(timezone.utc)
+        record = {
+            "_id": key_id,
+            "fingerprint": fingerprint,
+            "resource_id": ObjectId(),
+            "response": None,
+            "locked_until": now + timedelta(seconds=self.lock_seconds),
+            "created_at": now,
+        }
+        try:
+            await adb[COLLECTION].insert_one(record)
+            return Claim(key_id, fingerprint, record["resource_id"], first=True)
+        except DuplicateKeyError:
+            pass
+
+        existing = await adb[COLLECTION].find_one({"_id": key_id})
+        if existing is None:
+            # Expired between the insert and the read; treat as in flight
+            raise KeyInUse(key)
+        if existing["fingerprint"] != fingerprint:
+            raise KeyReused(key)
+        if existing.get("response") is not None:
+            self._done.set(key_id, (fingerprint, existing["resource_id"], existing["response"]))
+            return Claim(key_id, fingerprint, existing["resource_id"], first=False, response=existing["response"])
+
+        # Unfinished: take it over only once the previous attempt's lock has lapsed
+        taken = await adb[COLLECTION].find_one_and_update(
+            {"_id": key_id, "response": None, "locked_until": {"$lte": now}},
+            {"$set": {"locked_until": now + timedelta(seconds=self.lock_seconds)}},
+            projection={"resource_id": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if taken is None:
+            raise KeyInUse(key)
+        return Claim(key_id, fingerprint, taken["resource_id"], first=False)
+
+    async def complete(self, adb, claim: Claim, response: dict) -> None:
+        await adb[COLLECTION].update_one({"_id": claim.key_id}, {"$set": {"response": response}})
+        self._done.set(claim.key_id, (claim.fingerprint, claim.resource_id, response))
+
+    async def release(self, adb, claim: Claim) -> None:
+        """The attempt failed; let the next retry take over right away"""
+        await adb[COLLECTION].update_one(
+            {"_id": claim.key_id, "response": None}, {"$set": {"locked_until": datetime.now(timezone.utc)}}
+        )
+
+    def stats(self) -> dict:
+        return self._done.stats()
@@ -0,0 +1,37 @@
+"""
+ID codec
+
+The API speaks string ids; MongoDB stores ObjectIds. Ids are converted
+here, at the edge, so every _id filter uses the stored type and is a
+single hit on the _id index. A string that is not a valid ObjectId
+cannot name any document, so decode() returns None and callers answer
+404 without a query.
+
+References to a user held by other documents (reflection.user_id,
+groupmember, rollups, the leaderboards) stay in the string form that
+encode() produces.
+"""
+
+from typing import Iterable, List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+def decode(value) -> Optional[ObjectId]:
+    """ObjectId for an API id, or None if it cannot be one"""
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+
+def decode_many(values: Iterable) -> List[ObjectId]:
+    """ObjectIds for the valid ids among `values`"""
+    return [oid for oid in map(decode, values) if oid is not None]
+
+
+def encode(value: ObjectId) -> str:
+    return str(value)
@@ -0,0 +1,250 @@
+"""
+Index registry and index advisor
+
+Indexes are declared per Pydantic model from schemas.py (collection name is
+the lowercase class name) and applied idempotently at startup. Every key is
+checked against the model's fields so a renamed field cannot silently leave
+an index behind.
+
+The advisor runs explain() on every find and aggregation shape the app
+issues and reports any that fall back to a collection scan, except the
+background full scans registered in FULL_SCANS:
+
+    python indexes.py apply     # create missing indexes
+    python indexes.py check     # explain all query shapes, exit 1 on COLLSCAN
+"""
+
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Type
+
+from bson import ObjectId
+from pydantic import BaseModel
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from gallery import GALLERY_FILTER, GALLERY_PROJECTION, GALLERY_SORT, MAX_PAGE_SIZE, keyset_filter
+from groups import feed_match, group_feed_pipeline, small_group_feed_pipeline
+from leaderboard import USER_PROJECTION, week_days, week_rollup_query
+from rollups import ROLLUP_COLLECTION
+from schemas import Challenge, Group, GroupMember, IdempotencyKey, JoinCode, Reflection, User
+from stats import user_stats_pipeline
+
+logger = logging.getLogger(__name__)
+
+# Fields every stored document gets from the database helpers
+_IMPLICIT_FIELDS = {"_id", "created_at", "updated_at"}
+
+INDEX_REGISTRY: Dict[Type[BaseModel], List[IndexModel]] = {
+    User: [
+        IndexModel([("email", ASCENDING)], name="email_1"),
+    ],
+    Challenge: [
+        # catalog polling fallback: newest change first
+        IndexModel([("updated_at", DESCENDING)], name="updated_at_-1"),
+    ],
+    Group: [
+        # join by code
+        IndexModel([("code", ASCENDING)], name="code_1", unique=True),
+    ],
+    GroupMember: [
+        # member -> groups reverse index
+        IndexModel([("user_id", ASCENDING)], name="user_id_1"),
+        # group challenge fan-out
+        IndexModel([("group_id", ASCENDING)], name="group_id_1"),
+    ],
+    IdempotencyKey: [
+        # records expire IDEMPOTENCY_TTL_SECONDS after the first request
+        IndexModel(
+            [("created_at", ASCENDING)],
+            name="created_at_ttl",
+            expireAfterSeconds=int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400)),
+        ),
+    ],
+    JoinCode: [
+        # free-code claims ({group_id: null}); the code itself is the unique _id
+        IndexModel([("group_id", ASCENDING)], name="group_id_1"),
+    ],
+    Reflection: [
+        # get_profile: recent reflections for one user (prefix); /user/{id}/stats:
+        # the trailing fields make the stats $match + $project a covered query
+        IndexModel(
+            [
+                ("user_id", ASCENDING),
+                ("created_at", DESCENDING),
+                ("challenge_id", ASCENDING),
+                ("mood_before", ASCENDING),
+                ("mood_after", ASCENDING),
+            ],
+            name="user_id_1_created_at_-1_stats",
+        ),
+        # /gallery: newest public reflections, keyset paged on (created_at, _id)
+        IndexModel(
+            [("is_public", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="is_public_1_created_at_-1__id_-1",
+        ),
+        # group feed: newest reflections on one challenge
+        IndexModel([("challenge_id", ASCENDING), ("created_at", DESCENDING)], name="challenge_id_1_created_at_-1"),
+    ],
+}
+
+
+def collection_name(model: Type[BaseModel]) -> str:
+    return model.__name__.lower()
+
+
+def _validate_registry():
+    for model, indexes in INDEX_REGISTRY.items():
+        fields = set(model.model_fields) | _IMPLICIT_FIELDS
+        for index in indexes:
+            for key in index.document["key"]:
+                if key.split(".")[0] not in fields:
+                    raise ValueError(f"Index {index.document['name']} references unknown field {model.__name__}.{key}")
+
+
+_validate_registry()
+
+
+async def ensure_indexes(adb) -> None:
+    """Create every registered index (no-op for ones that already exist)"""
+    for model, indexes in INDEX_REGISTRY.items():
+        name = collection_name(model)
+        created = await adb[name].create_indexes(indexes)
+        logger.info("Indexes ensured on %s: %s", name, ", ".join(created))
+
+
+def ensure_indexes_sync(db) -> None:
+    """Blocking variant of ensure_indexes for CLI use"""
+    for model, indexes in INDEX_REGISTRY.items():
+        name = collection_name(model)
+        created = db[name].create_indexes(indexes)
+        print(f"{name}: {', '.join(created)}")
+
+
+# ----------------------
+# Index advisor
+# ----------------------
+
+# (label, collection, filter, projection, sort, limit) for every query the app issues
+_WEEK_ROLLUPS, _WEEK_ROLLUP_FIELDS = week_rollup_query(week_days(datetime.now(timezone.utc).date()))
+QUERY_SHAPES = [
+    ("user by _id", "user", {"_id": ObjectId()}, None, None, 1),
+    ("user by email", "user", {"email": "someone@example.com"}, None, None, 1),
+    ("challenge catalog poll", "challenge", {}, {"updated_at": 1}, [("updated_at", -1)], 1),
+    ("group by code", "group", {"code": "ABC123"}, None, None, 1),
+    ("free join code", "joincode", {"group_id": None}, None, None, 1),
+    ("groups of a member", "groupmember", {"user_id": "sample-user"}, None, None, 0),
+    ("group fan-out", "groupmember", {"group_id": "sample-group"}, None, None, 0),
+    ("profile recent reflections", "reflection", {"user_id": "sample-user"}, None, [("created_at", -1)], 5),
+    ("gallery first page", "reflection", GALLERY_FILTER, GALLERY_PROJECTION, GALLERY_SORT, MAX_PAGE_SIZE),
+    (
+        "gallery keyset page",
+        "reflection",
+        keyset_filter((datetime.now(timezone.utc), ObjectId())),
+        GALLERY_PROJECTION,
+        GALLERY_SORT,
+        MAX_PAGE_SIZE,
+    ),
+    ("leaderboard users", "user", {}, USER_PROJECTION, None, 0),
+    ("leaderboard week rollups", ROLLUP_COLLECTION, _WEEK_ROLLUPS, _WEEK_ROLLUP_FIELDS, None, 0),
+]
+
+# (label, collection, pipeline) for every aggregation the app issues
+_FEED_MATCH = feed_match("c1", datetime.now(timezone.utc))
+AGGREGATION_SHAPES = [
+    ("user stats fallback", "reflection", user_stats_pipeline("sample-user")),
+    ("group feed", "reflection", group_feed_pipeline(ObjectId(), _FEED_MATCH, 20)),
+    ("small group feed", "reflection", small_group_feed_pipeline(_FEED_MATCH, ["sample-user", "other-user"], 20)),
+]
+
+# Shapes that scan their whole collection on purpose: leaderboard rebuilds
+# read every user, and rollup day fields are dynamic keys no index can cover.
+# Both run in the background every LEADERBOARD_REBUILD_SECONDS.
+FULL_SCANS = {"leaderboard users", "leaderboard week rollups"}
+
+
+def _stages(plan):
+    """Yield every stage name in an explain plan tree"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _stages(value)
+
+
+def _winning_plans(explain):
+    """Yield every winningPlan in an explain result
+
+    A find has one under queryPlanner; an aggregation has one per stage
+    that reads a collection ($cursor, or a top-level queryPlanner when the
+    server pushes the pipeline down into the query engine).
+    """
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "winningPlan":
+                yield value
+            elif key != "rejectedPlans":
+                yield from _winning_plans(value)
+    elif isinstance(explain, list):
+        for value in explain:
+            yield from _winning_plans(value)
+
+
+def _result(label: str, coll: str, explain: dict) -> dict:
+    stages = [stage for plan in _winning_plans(explain) for stage in _stages(plan)]
+    return {
+        "query": label,
+        "collection": coll,
+        "stages": stages,
+        "collscan": "COLLSCAN" in stages,
+        "full_scan": label in FULL_SCANS,
+    }
+
+
+def explain_query_shapes(db) -> List[dict]:
+    """Explain each registered find and aggregation shape and report its winning plan stages"""
+    results = []
+    for label, coll, filter_dict, projection, sort, limit in QUERY_SHAPES:
+        cursor = db[coll].find(filter_dict, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        results.append(_result(label, coll, cursor.explain()))
+    for label, coll, pipeline in AGGREGATION_SHAPES:
+        results.append(_result(label, coll, db.command("aggregate", coll, pipeline=pipeline, explain=True)))
+    return results
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    from database import get_db
+
+    parser = argparse.ArgumentParser(description="Apply and verify MongoDB indexes")
+    parser.add_argument("command", choices=["apply", "check"])
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    if db is None:
+        print("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+        return 2
+
+    if args.command == "apply":
+        ensure_indexes_sync(db)
+        return 0
+
+    failures = 0
+    for r in explain_query_shapes(db):
+        failed = r["collscan"] and not r["full_scan"]
+        status = "COLLSCAN" if failed else "scan" if r["collscan"] else "ok"
+        print(f"[{status:>8}] {r['collection']:<12} {r['query']:<28} {' > '.join(r['stages'])}")
+        failures += failed
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
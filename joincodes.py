@@ -0,0 +1,161 @@
+"""
+Group join codes
+
+Codes are allocated from a pool of pre-generated ones in the `joincode`
+collection (_id = code, so uniqueness is the _id index). Batches of random
+codes are inserted unordered and any that already exist are simply
+dropped, so generation never loops on collisions. Creating a group claims
+one free code with a single find_one_and_update, which is atomic per
+document: two concurrent creators can never get the same code. Custom
+codes go through the same collection, so they cannot clash with
+generated ones either.
+
+Join lookups resolve code -> group_id through an in-process cache. A
+claimed code never changes group, so hits are cached for a long time;
+unknown codes are cached too (negative caching) for a short TTL, so
+guessing or mistyped codes do not each cost a round trip.
+"""
+
+import asyncio
+import os
+import re
+import secrets
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from cache import TTLCache
+
+COLLECTION = "joincode"
+
+ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"  # no 0/O, 1/I
+CODE_LENGTH = 6
+# Custom codes may use any letters and digits
+_WELL_FORMED = re.compile(r"^[A-Z0-9]{4,12}$")
+
+
+def normalize(code: str) -> str:
+    return code.strip().upper()
+
+
+def well_formed(code: str) -> bool:
+    return bool(_WELL_FORMED.match(code))
+
+
+class JoinCodes:
+    """Join code allocator plus the code -> group_id lookup cache"""
+
+    def __init__(
+        self,
+        batch_size: int = 1000,
+        low_water: int = 200,
+        cache_size: int = 50_000,
+        cache_ttl: float = 3600.0,
+        negative_ttl: float = 30.0,
+    ):
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self._known = TTLCache(cache_size, cache_ttl)
+        self._unknown = TTLCache(cache_size, negative_ttl)
+        self._fill_lock = asyncio.Lock()
+
+    @staticmethod
+    def generate(n: int) -> list:
+        return ["".join(secrets.choice(ALPHABET) for _ in range(CODE_LENGTH)) for _ in range(n)]
+
+    async def fill(self, adb, n: Optional[int] = None) -> int:
+        """Insert a batch of fresh codes; returns how many were new"""
+        now = datetime.now(timezone.utc)
+        docs = [{"_id": code, "group_id": None, "created_at": now} for code in set(self.generate(n or self.batch_size))]
+        try:
+            result = await adb[COLLECTION].insert_many(docs, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            # Codes that already exist are skipped; anything else is a real failure
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+            return e.details.get("nInserted", 0)
+
+    async def top_up(self, adb) -> None:
+        """Make sure at least `low_water` free codes are waiting"""
+        free = await adb[COLLECTION].count_documents({"group_id": None}, limit=self.low_water)
+        if free < self.low_water:
+            async with self._fill_lock:
+                await self.fill(adb)
+
+    async def allocate(self, adb, group_id: str) -> str:
+        """Claim a free code for `group_id`"""
+        for _ in range(3):
+            doc = await adb[COLLECTION].find_one_and_update(
+                {"group_id": None},
+                {"$set": {"group_id": group_id, "claimed_at": datetime.now(timezone.utc)}},
+                projection={"_id": 1},
+                return_document=ReturnDocument.AFTER,
+            )
+            if doc is not None:
+                self._remember(doc["_id"], group_id)
+                return doc["_id"]
+            # Pool exhausted; concurrent creators wait for one refill
+            async with self._fill_lock:
+                if await adb[COLLECTION].count_documents({"group_id": None}, limit=1) == 0:
+                    await self.fill(adb)
+        raise RuntimeError("Join code pool could not be refilled")
+
+    async def reserve(self, adb, code: str, group_id: str) -> bool:
+        """Claim a specific (custom) code; False if it is taken"""
+        now = datetime.now(timezone.utc)
+        try:
+            await adb[COLLECTION].insert_one({"_id": code, "group_id": group_id, "created_at": now, "claimed_at": now})
+        except DuplicateKeyError:
+            # Still fine if it is an unclaimed pre-generated code
+            doc = await adb[COLLECTION].find_one_and_update(
+                {"_id": code, "group_id": None},
+                {"$set": {"group_id": group_id, "claimed_at": now}},
+                projection={"_id": 1},
+            )
+            if doc is None:
+                return False
+        self._remember(code, group_id)
+        return True
+
+    async def release(self, adb, code: str, group_id: str) -> None:
+        """Undo a claim whose group could not be created"""
+        await adb[COLLECTION].delete_one({"_id": code, "group_id": group_id})
+        self._known.invalidate(code)
+
+    async def resolve(self, adb, code: str) -> Optional[str]:
+        """group_id for a join code, or None if no group has it"""
+        code = normalize(code)
+        if not well_formed(code):
+            return None
+        group_id = self._known.get(code)
+        if group_id is not None:
+            return group_id
+        if self._unknown.get(code):
+            return None
+
+        doc = await adb[COLLECTION].find_one({"_id": code}, {"group_id": 1})
+        group_id = doc.get("group_id") if doc else None
+        if group_id:
+            self._known.set(code, group_id)
+        else:
+            self._unknown.set(code, True)
+        return group_id
+
+    def _remember(self, code: str, group_id: str) -> None:
+        self._unknown.invalidate(code)
+        self._known.set(code, group_id)
+
+    def stats(self) -> dict:
+        return {"known": self._known.stats(), "unknown": self._unknown.stats()}
+
+
+join_codes = JoinCodes(
+    batch_size=int(os.getenv("JOIN_CODE_BATCH_SIZE", 1000)),
+    low_water=int(os.getenv("JOIN_CODE_LOW_WATER", 200)),
+    cache_size=int(os.getenv("JOIN_CODE_CACHE_SIZE", 50000)),
+    cache_ttl=float(os.getenv("JOIN_CODE_CACHE_TTL_SECONDS", 3600)),
+    negative_ttl=float(os.getenv("JOIN_CODE_NEGATIVE_TTL_SECONDS", 30)),
+)
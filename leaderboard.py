@@ -0,0 +1,278 @@
+"""
+Leaderboards
+
+Rankings are kept in memory in an indexable skip list ordered by
+(-score, user_id), which gives O(log n) insert, remove, "my rank" and
+offset lookups. Boards:
+
+    xp / all      total XP (user.xp)
+    xp / day      XP earned since 00:00 UTC
+    xp / week     XP earned since Monday 00:00 UTC
+    streak / all  current streak
+
+/reflect feeds the boards incrementally; the XP gained is the difference
+from the total the xp/all board last saw, so gains made through other
+workers are picked up on the next update. Boards are rebuilt from the
+`user` and `user_rollup` collections at startup and every
+LEADERBOARD_REBUILD_SECONDS to bound drift between workers.
+"""
+
+import asyncio
+import logging
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pymongo.errors import PyMongoError
+
+from rollups import ROLLUP_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+_MAX_LEVEL = 32
+
+USER_PROJECTION = {"name": 1, "xp": 1, "streak": 1}
+
+
+def week_days(today: date) -> List[str]:
+    """ISO dates from Monday through `today`"""
+    monday = today - timedelta(days=today.weekday())
+    return [(monday + timedelta(days=i)).isoformat() for i in range((today - monday).days + 1)]
+
+
+def week_rollup_query(days: List[str]) -> Tuple[dict, dict]:
+    """Filter and projection for the rollups with completions on any of `days`
+
+    A full scan of user_rollup by design (indexes.FULL_SCANS): the day
+    fields are dynamic keys, so no index can serve the filter. It runs once
+    per rebuild, off the request path, and only the matching rollups' day
+    counters cross the wire.
+    """
+    projection = {f"days.{d}": 1 for d in days}
+    return {"$or": [{field: {"$exists": True}} for field in projection]}, projection
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.next: List[Optional["_Node"]] = [None] * level
+        # width[i]: positions skipped by following next[i] (the end counts as size + 1)
+        self.width: List[int] = [1] * level
+
+
+class IndexableSkipList:
+    """Sorted set of unique, comparable keys with O(log n) rank and index access"""
+
+    def __init__(self, seed: Optional[int] = None):
+        self._head = _Node(None, _MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+        self._random = random.Random(seed)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < _MAX_LEVEL and self._random.random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, key) -> None:
+        update = [self._head] * _MAX_LEVEL
+        steps = [0] * _MAX_LEVEL
+        node, pos = self._head, 0
+        for lvl in reversed(range(self._level)):
+            while node.next[lvl] is not None and node.next[lvl].key < key:
+                pos += node.width[lvl]
+                node = node.next[lvl]
+            update[lvl], steps[lvl] = node, pos
+
+        height = self._random_level()
+        if height > self._level:
+            for lvl in range(self._level, height):
+                self._head.width[lvl] = self._size + 1
+            self._level = height
+
+        new = _Node(key, height)
+        for lvl in range(height):
+            prev = update[lvl]
+            new.next[lvl] = prev.next[lvl]
+            prev.next[lvl] = new
+            new.width[lvl] = prev.width[lvl] - (pos - steps[lvl])
+            prev.width[lvl] = pos + 1 - steps[lvl]
+        for lvl in range(height, self._level):
+            update[lvl].width[lvl] += 1
+        self._size += 1
+
+    def remove(self, key) -> None:
+        update = [self._head] * _MAX_LEVEL
+        node = self._head
+        for lvl in reversed(range(self._level)):
+            while node.next[lvl] is not None and node.next[lvl].key < key:
+                node = node.next[lvl]
+            update[lvl] = node
+        target = node.next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for lvl in range(self._level):
+            prev = update[lvl]
+            if prev.next[lvl] is target:
+                prev.width[lvl] += target.width[lvl] - 1
+                prev.next[lvl] = target.next[lvl]
+            else:
+                prev.width[lvl] -= 1
+        self._size -= 1
+
+    def index(self, key) -> int:
+        """0-based position of `key`; raises KeyError if absent"""
+        node, pos = self._head, 0
+        for lvl in reversed(range(self._level)):
+            while node.next[lvl] is not None and node.next[lvl].key < key:
+                pos += node.width[lvl]
+                node = node.next[lvl]
+        if node.next[0] is None or node.next[0].key != key:
+            raise KeyError(key)
+        return pos
+
+    def islice(self, start: int, stop: int) -> Iterator:
+        """Keys at positions [start, stop)"""
+        if start >= min(stop, self._size):
+            return
+        node, pos = self._head, 0
+        for lvl in reversed(range(self._level)):
+            while node.next[lvl] is not None and pos + node.width[lvl] <= start + 1:
+                pos += node.width[lvl]
+                node = node.next[lvl]
+        for _ in range(start, min(stop, self._size)):
+            yield node.key
+            node = node.next[0]
+
+
+class Board:
+    """One ranking: user_id -> score, highest first, ties by user_id"""
+
+    def __init__(self):
+        self._scores: Dict[str, int] = {}
+        self._ranks = IndexableSkipList()
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def score(self, user_id: str) -> Optional[int]:
+        return self._scores.get(user_id)
+
+    def set(self, user_id: str, score: int) -> None:
+        old = self._scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            self._ranks.remove((-old, user_id))
+        self._scores[user_id] = score
+        self._ranks.insert((-score, user_id))
+
+    def add(self, user_id: str, delta: int) -> None:
+        self.set(user_id, self._scores.get(user_id, 0) + delta)
+
+    def rank(self, user_id: str) -> Optional[int]:
+        """1-based rank, or None if the user is not on the board"""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return self._ranks.index((-score, user_id)) + 1
+
+    def top(self, limit: int, offset: int = 0) -> List[Tuple[int, str, int]]:
+        """(rank, user_id, score) for ranks offset+1 .. offset+limit"""
+        return [
+            (offset + i + 1, user_id, -neg_score)
+            for i, (neg_score, user_id) in enumerate(self._ranks.islice(offset, offset + limit))
+        ]
+
+
+def _xp_for_day(completions: int) -> int:
+    # apply_completion: the first completion of a day is worth 10, later ones 5
+    return 10 + 5 * (completions - 1) if completions else 0
+
+
+class Leaderboards:
+    """All boards plus the bookkeeping to roll the day/week windows"""
+
+    WINDOWS = {"xp": ("all", "day", "week"), "streak": ("all",)}
+
+    def __init__(self):
+        self.names: Dict[str, Optional[str]] = {}
+        self._reset_all()
+
+    def _reset_all(self, today: Optional[date] = None) -> None:
+        today = today or datetime.now(timezone.utc).date()
+        self.boards = {(by, window): Board() for by, windows in self.WINDOWS.items() for window in windows}
+        self._day = today
+        self._week = today.isocalendar()[:2]
+
+    def _roll_windows(self, today: date) -> None:
+        if today != self._day:
+            self.boards[("xp", "day")] = Board()
+            self._day = today
+        if today.isocalendar()[:2] != self._week:
+            self.boards[("xp", "week")] = Board()
+            self._week = today.isocalendar()[:2]
+
+    def board(self, by: str, window: str) -> Board:
+        self._roll_windows(datetime.now(timezone.utc).date())
+        return self.boards[(by, window)]
+
+    def record(self, user_id: str, xp: int, streak: int) -> None:
+        """Apply a user's new totals after one or more completions"""
+        self._roll_windows(datetime.now(timezone.utc).date())
+        previous = self.boards[("xp", "all")].score(user_id)
+        # Users missing from the board (joined before the last rebuild failed)
+        # get their window XP from the next rebuild instead of a guess here
+        gained = max(0, xp - previous) if previous is not None else 0
+        self.boards[("xp", "all")].set(user_id, xp)
+        self.boards[("streak", "all")].set(user_id, streak)
+        if gained:
+            self.boards[("xp", "day")].add(user_id, gained)
+            self.boards[("xp", "week")].add(user_id, gained)
+
+    def register(self, user_id: str, name: Optional[str]) -> None:
+        """Put a newly signed-up user on the all-time boards"""
+        self.names[user_id] = name
+        self.boards[("xp", "all")].set(user_id, 0)
+        self.boards[("streak", "all")].set(user_id, 0)
+
+    def ranks(self, user_id: str) -> dict:
+        return {f"{by}_{window}": self.board(by, window).rank(user_id) for by, window in self.boards}
+
+    async def rebuild(self, adb) -> None:
+        """Reload every board from MongoDB and swap them in"""
+        today = datetime.now(timezone.utc).date()
+        days_this_week = week_days(today)
+
+        fresh = Leaderboards()
+        fresh._reset_all(today)
+        async for u in adb["user"].find({}, USER_PROJECTION):
+            uid = str(u["_id"])
+            fresh.names[uid] = u.get("name")
+            fresh.boards[("xp", "all")].set(uid, u.get("xp", 0))
+            fresh.boards[("streak", "all")].set(uid, u.get("streak", 0))
+
+        query, projection = week_rollup_query(days_this_week)
+        async for r in adb[ROLLUP_COLLECTION].find(query, projection):
+            days = r.get("days", {})
+            week_xp = sum(_xp_for_day(days.get(d, 0)) for d in days_this_week)
+            fresh.boards[("xp", "week")].set(r["_id"], week_xp)
+            if today.isoformat() in days:
+                fresh.boards[("xp", "day")].set(r["_id"], _xp_for_day(days[today.isoformat()]))
+
+        self.names, self.boards, self._day, self._week = fresh.names, fresh.boards, fresh._day, fresh._week
+
+    async def keep_fresh(self, adb, interval: float) -> None:
+        """Rebuild every `interval` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.rebuild(adb)
+            except PyMongoError as e:
+                logger.warning("Leaderboard rebuild failed: %s", e)
@@ -1,15 +1,146 @@
+import asyncio
+import logging
 import os
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
+from bson import ObjectId
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-
-from database import db, create_document, get_documents
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from cache import TTLCache
+from catalog import ChallengeCatalog
+import database
+import export
+from database import (
+    find_one_and_update_async,
+    find_one_async,
+    get_async_db,
+    get_documents_async,
+    insert_document_async,
+    insert_documents_async,
+    new_document,
+    update_one_async,
+    upsert_document_async,
+)
+from gallery import gallery_feed
+import groups
+import joincodes
+from health import HealthMonitor
+import ids
+import metrics
+from idempotency import Claim, IdempotencyStore, KeyInUse, KeyReused, fingerprint
+from indexes import ensure_indexes
+from joincodes import join_codes
+from leaderboard import Leaderboards
+import rollups
+from slowlog import slow_queries
+from serialization import ORJSONResponse, json_bytes_response
 from schemas import User as UserSchema, Reflection as ReflectionSchema
+from stats import user_stats
+from writebehind import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+
+# Readiness, as opposed to liveness ("/"): the process only reports ready
+# once MongoDB has answered and startup data (indexes, challenge catalog)
+# is loaded, so autoscalers do not route to a pod that is still warming up.
+readiness = {"ready": False, "first_query_seconds": None}
+
+# Optional write-behind for /reflect inserts (REFLECT_WRITE_BEHIND=1)
+reflection_writer = WriteBehindBuffer(
+    "reflection",
+    spill_dir=os.getenv("WRITE_BEHIND_SPILL_DIR", "spill"),
+    flush_ms=float(os.getenv("WRITE_BEHIND_FLUSH_MS", 50)),
+    batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 500)),
+    max_queue=int(os.getenv("WRITE_BEHIND_MAX_QUEUE", 10000)),
+    fsync=os.getenv("WRITE_BEHIND_FSYNC", "1") != "0",
+    on_flush=rollups.record,
+) if os.getenv("REFLECT_WRITE_BEHIND") == "1" else None
+
+idempotency = IdempotencyStore(
+    ttl=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400)),
+    cache_size=int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10000)),
+)
+
+health_monitor = HealthMonitor(
+    interval=float(os.getenv("HEALTH_PING_SECONDS", 5)),
+    detail_interval=float(os.getenv("HEALTH_DETAIL_SECONDS", 30)),
+)
+
+
+async def warm_up(adb, started: float):
+    while True:
+        try:
+            await adb.command("ping")
+            break
+        except PyMongoError as e:
+            logger.warning("Waiting for MongoDB: %s", e)
+            await asyncio.sleep(1)
+    readiness["first_query_seconds"] = round(time.monotonic() - started, 4)
+    logger.info("First successful query %.3fs after startup", readiness["first_query_seconds"])
+
+    try:
+        await ensure_indexes(adb)
+    except Exception as e:
+        # Serve anyway; queries still work, just without the indexes
+        logger.warning("Index bootstrap failed: %s", e)
+    try:
+        await challenge_catalog.load_from(adb)
+    except Exception as e:
+        logger.warning("Challenge catalog load failed, serving built-in challenges: %s", e)
+    try:
+        await leaderboards.rebuild(adb)
+    except Exception as e:
+        logger.warning("Leaderboard rebuild failed: %s", e)
+    try:
+        await join_codes.top_up(adb)
+    except Exception as e:
+        # allocate() refills on demand
+        logger.warning("Join code pre-generation failed: %s", e)
+    readiness["ready"] = True
+
+    await asyncio.gather(
+        challenge_catalog.follow(adb, poll_seconds=float(os.getenv("CHALLENGE_POLL_SECONDS", 30))),
+        leaderboards.keep_fresh(adb, interval=float(os.getenv("LEADERBOARD_REBUILD_SECONDS", 300))),
+    )
+
 
-app = FastAPI(title="Joybait API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing here blocks on the database; warm_up runs in the background
+    started = time.monotonic()
+    adb = get_async_db()
+    tasks = []
+    if adb is not None:
+        tasks.append(asyncio.create_task(warm_up(adb, started)))
+        tasks.append(asyncio.create_task(health_monitor.run(adb)))
+        slow_queries.open()
+        tasks.append(asyncio.create_task(slow_queries.run(adb)))
+        if reflection_writer is not None:
+            reflection_writer.open()
+            tasks.append(asyncio.create_task(reflection_writer.run(adb)))
+    yield
+    for task in tasks:
+        task.cancel()
+    # Let each task unwind before the client and the writer's segments close
+    # under it; CancelledError (or whatever a task died of) is expected here
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if reflection_writer is not None and adb is not None:
+        # Drain queued reflections; anything that cannot be written stays spilled
+        await reflection_writer.close(adb)
+    slow_queries.close()
+    database.close()
+
+
+app = FastAPI(title="Joybait API", version="0.1.0", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,6 +149,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Added last so it is outermost and times CORS handling too
+app.add_middleware(metrics.MetricsMiddleware)
 
 # ----------------------
 # Utility / seed content
@@ -58,6 +191,13 @@ SEED_CHALLENGES = [
     },
 ]
 
+# Served from an in-memory snapshot of the `challenge` collection (see lifespan);
+# the seeds are the fallback while the collection is empty
+challenge_catalog = ChallengeCatalog(SEED_CHALLENGES)
+
+# In-memory rankings, rebuilt from Mongo at startup (see warm_up)
+leaderboards = Leaderboards()
+
 # Simple badge logic for MVP
 BADGES = [
     {"id": "first", "name": "First Step", "requirement": 1},
@@ -65,6 +205,82 @@ BADGES = [
     {"id": "streak5", "name": "On a Roll", "requirement": 5},
 ]
 
+MAX_REFLECTION_BATCH = 500
+# Guarded per-user batch updates retried when a concurrent /reflect wins
+BATCH_UPDATE_ATTEMPTS = 10
+# Ids of the last few batches applied to a user (user.replayed_batches), so
+# a bulk_write that matched short can tell which users' updates missed
+REPLAYED_BATCHES = 10
+RECENT_REFLECTIONS = 5
+
+# Fields each read path actually uses; everything else (notably
+# preferences and note) stays on the server
+PROFILE_USER_FIELDS = {"name": 1, "mode": 1, "xp": 1, "streak": 1}
+PROFILE_REFLECTION_FIELDS = {"challenge_id": 1, "mood_before": 1, "mood_after": 1, "note": 1, "created_at": 1}
+STREAK_FIELDS = {"last_completed_at": 1, "streak": 1, "xp": 1}
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+# Profiles are cached per worker; TTL bounds staleness from other workers' writes
+profile_cache = TTLCache(
+    maxsize=int(os.getenv("PROFILE_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("PROFILE_CACHE_TTL_SECONDS", 30)),
+)
+
+
+def apply_completion(last_completed_at: Optional[datetime], streak: int, completed_at: datetime):
+    """XP gain and new streak for a completion at `completed_at`
+
+    A completion at or before `last_completed_at` (an older item in an
+    offline replay) earns repeat XP and leaves the streak alone.
+    """
+    if isinstance(last_completed_at, datetime):
+        # PyMongo returns naive UTC datetimes
+        if last_completed_at.tzinfo is None:
+            last_completed_at = last_completed_at.replace(tzinfo=timezone.utc)
+        if completed_at.tzinfo is None:
+            completed_at = completed_at.replace(tzinfo=timezone.utc)
+        if completed_at <= last_completed_at:
+            return 5, streak
+    last_date = last_completed_at.date() if isinstance(last_completed_at, datetime) else None
+    today = completed_at.date()
+    if last_date == today:
+        # already completed today: small xp
+        return 5, streak
+    if last_date and (today - last_date).days == 1:
+        return 10, streak + 1
+    return 10, 1
+
+
+# apply_completion as an update pipeline, evaluated by MongoDB against $$NOW.
+# Days are compared as whole UTC days since the epoch.
+_DAY_MS = 24 * 60 * 60 * 1000
+COMPLETION_PIPELINE = [
+    {"$set": {
+        "_today": {"$floor": {"$divide": [{"$toLong": "$$NOW"}, _DAY_MS]}},
+        "_last_day": {"$floor": {"$divide": [{"$toLong": "$last_completed_at"}, _DAY_MS]}},
+    }},
+    {"$set": {
+        "xp": {"$add": [
+            {"$ifNull": ["$xp", 0]},
+            {"$cond": [{"$eq": ["$_last_day", "$_today"]}, 5, 10]},
+        ]},
+        "streak": {"$switch": {
+            "branches": [
+                {"case": {"$eq": ["$_last_day", "$_today"]}, "then": {"$ifNull": ["$streak", 0]}},
+                {"case": {"$eq": ["$_last_day", {"$subtract": ["$_today", 1]}]},
+                 "then": {"$add": [{"$ifNull": ["$streak", 0]}, 1]}},
+            ],
+            "default": 1,
+        }},
+        "last_completed_at": "$$NOW",
+    }},
+    {"$unset": ["_today", "_last_day"]},
+]
+
+
+def compute_badges(xp: int, streak: int):
+    return [b for b in BADGES if xp >= b["requirement"] or streak >= b["requirement"]]
+
 
 # ----------------------
 # Models (requests)
@@ -92,17 +308,49 @@ class ReflectionRequest(BaseModel):
     note: Optional[str] = None
     is_public: bool = False
 
+class CreateGroupRequest(BaseModel):
+    name: str
+    owner_id: str
+    code: Optional[str] = None
+
+class JoinGroupRequest(BaseModel):
+    code: str
+    user_id: str
+
+class GroupChallengeRequest(BaseModel):
+    user_id: str  # must be the group owner
+    challenge_id: str
+
+class QueuedReflectionRequest(ReflectionRequest):
+    completed_at: Optional[datetime] = None  # client time for offline replays; defaults to now
+
 
 # ----------------------
 # Health
 # ----------------------
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Joybait backend running"}
 
+@app.get("/ready")
+async def ready(response: Response):
+    if not readiness["ready"]:
+        response.status_code = 503
+    return readiness
+
+@app.get("/healthz")
+async def healthz(response: Response, detailed: bool = False):
+    # Served from memory; `detailed=true` adds server stats (rate limited)
+    body = health_monitor.snapshot()
+    if not health_monitor.healthy:
+        response.status_code = 503
+    elif detailed:
+        body["detail"] = await health_monitor.detailed(get_async_db())
+    return body
+
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -112,16 +360,19 @@ def test_database():
         "collections": [],
     }
     try:
-        if db is not None:
+        adb = get_async_db()
+        if adb is not None:
             response["database"] = "✅ Available"
             response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
             response["database_name"] = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
-            try:
-                response["collections"] = db.list_collection_names()
+            # Answered from the health pinger's cache; the collection list is
+            # refreshed at most once per HEALTH_DETAIL_SECONDS
+            if health_monitor.healthy:
+                response["collections"] = (await health_monitor.detailed(adb))["collections"]
                 response["database"] = "✅ Connected & Working"
                 response["connection_status"] = "Connected"
-            except Exception as e:
-                response["database"] = f"⚠️  Connected but Error: {str(e)[:80]}"
+            elif health_monitor.error:
+                response["database"] = f"⚠️  Connected but Error: {health_monitor.error[:80]}"
         else:
             response["database"] = "⚠️  Available but not initialized"
     except Exception as e:
@@ -133,26 +384,74 @@ def test_database():
 # Auth (MVP pseudo-auth)
 # ----------------------
 
+async def _claim(adb, scope: str, key: Optional[str], payload: BaseModel) -> Optional[Claim]:
+    """Claim the request's Idempotency-Key, or None when it sent none"""
+    if not key:
+        return None
+    if adb is None:
+        raise HTTPException(500, "Database not configured")
+    try:
+        return await idempotency.begin(adb, scope, key, fingerprint(payload))
+    except KeyInUse:
+        raise HTTPException(409, "A request with this Idempotency-Key is still in progress")
+    except KeyReused:
+        raise HTTPException(422, "Idempotency-Key was already used with a different request body")
+
+
 @app.post("/auth/signup")
-def signup(payload: SignupRequest):
+async def signup(payload: SignupRequest, idempotency_key: Optional[str] = Header(None)):
+    adb = get_async_db()
+    claim = await _claim(adb, "signup", idempotency_key, payload)
+    if claim is not None and claim.response is not None:
+        return claim.response
+
     # For MVP, create anonymous-ish user document and return its id
-    user = UserSchema(
+    user = new_document(UserSchema(
         name=payload.name,
         email=payload.email,
         mode=payload.mode,
         xp=0,
         streak=0,
         preferences={},
-    )
-    user_id = create_document("user", user)
-    return {"user_id": user_id}
+    ))
+    if claim is not None:
+        user["_id"] = claim.resource_id
+    try:
+        if claim is not None and not claim.first:
+            created = await upsert_document_async("user", user)
+        else:
+            await insert_document_async("user", user)
+            created = True
+        await rollups.create(adb, ids.encode(user["_id"]))
+    except Exception:
+        if claim is not None:
+            await idempotency.release(adb, claim)
+        raise
+    user_id = ids.encode(user["_id"])
+    if created:
+        leaderboards.register(user_id, payload.name)
+    response = {"user_id": user_id}
+    if claim is not None:
+        await idempotency.complete(adb, claim, response)
+    return response
+
+def _user_oid(user_id: str) -> ObjectId:
+    """Stored _id for an API user id; 404 when it cannot name a user"""
+    oid = ids.decode(user_id)
+    if oid is None:
+        raise HTTPException(404, "User not found")
+    return oid
+
 
 @app.post("/user/{user_id}/mode")
-def set_mode(user_id: str, payload: ModeRequest):
+async def set_mode(user_id: str, payload: ModeRequest):
     # Save as preference document for simplicity
-    if db is None:
+    adb = get_async_db()
+    if adb is None:
         raise HTTPException(500, "Database not configured")
-    db["user"].update_one({"_id": {"$eq": db.get_default_codec_options().document_class().get("_id", user_id)}}, {"$set": {"mode": payload.mode}})
+    if not await update_one_async("user", {"_id": _user_oid(user_id)}, {"$set": {"mode": payload.mode}}):
+        raise HTTPException(404, "User not found")
+    profile_cache.update(user_id, lambda p: {**p, "user": {**p["user"], "mode": payload.mode}})
     return {"ok": True, "mode": payload.mode}
 
 
@@ -161,28 +460,25 @@ def set_mode(user_id: str, payload: ModeRequest):
 # ----------------------
 
 @app.post("/challenge/next")
-def get_next_challenge(filters: ChallengeFilter):
-    # Filter from seed list for MVP
-    candidates = SEED_CHALLENGES
-    if filters.mood:
-        candidates = [c for c in candidates if c["mood"] == filters.mood]
-    if filters.environment:
-        candidates = [c for c in candidates if c["environment"] == filters.environment]
-    if filters.confidence_min is not None:
-        candidates = [c for c in candidates if c["confidence"] >= filters.confidence_min]
-    if filters.confidence_max is not None:
-        candidates = [c for c in candidates if c["confidence"] <= filters.confidence_max]
-
-    if not candidates:
+async def get_next_challenge(filters: ChallengeFilter):
+    challenge = challenge_catalog.pick(
+        # Simple rotation: pick by day index
+        datetime.now(timezone.utc).toordinal(),
+        mood=filters.mood,
+        environment=filters.environment,
+        confidence_min=filters.confidence_min,
+        confidence_max=filters.confidence_max,
+    )
+    if challenge is None:
         raise HTTPException(404, "No challenges match those filters yet")
-
-    # Simple rotation: pick by day index
-    idx = datetime.now(timezone.utc).toordinal() % len(candidates)
-    return candidates[idx]
+    return challenge
 
 @app.get("/challenges")
-def list_challenges():
-    return SEED_CHALLENGES
+async def list_challenges(if_none_match: Optional[str] = Header(None)):
+    index = challenge_catalog.index  # body and etag from the same snapshot
+    if if_none_match and index.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": index.etag})
+    return json_bytes_response(index.body, headers={"ETag": index.etag})
 
 
 # ----------------------
@@ -190,63 +486,206 @@ def list_challenges():
 # ----------------------
 
 @app.post("/reflect")
-def submit_reflection(payload: ReflectionRequest):
-    # Save reflection
-    ref = ReflectionSchema(**payload.model_dump())
-    reflection_id = create_document("reflection", ref)
-
-    # Update XP and streak
-    if db is None:
+async def submit_reflection(payload: ReflectionRequest, idempotency_key: Optional[str] = Header(None)):
+    adb = get_async_db()
+    if adb is None:
         raise HTTPException(500, "Database not configured")
+    _user_oid(payload.user_id)
+    claim = await _claim(adb, "reflect", idempotency_key, payload)
+    if claim is not None and claim.response is not None:
+        return claim.response
+    try:
+        response = await _record_reflection(adb, payload, claim)
+    except Exception:
+        if claim is not None:
+            await idempotency.release(adb, claim)
+        raise
+    if claim is not None:
+        await idempotency.complete(adb, claim, response)
+    return response
 
-    user_doc = db["user"].find_one({"_id": {"$exists": True}})  # naive, will update by id next
-    # Better: use the provided id
-    user_doc = db["user"].find_one({"_id": payload.user_id}) if db else None
-
-    today = datetime.now(timezone.utc).date()
 
-    if user_doc:
-        last = user_doc.get("last_completed_at")
-        last_date = last.date() if isinstance(last, datetime) else None
-        streak = user_doc.get("streak", 0)
-        if last_date == today:
-            # already completed today: small xp
-            xp_gain = 5
-        else:
-            xp_gain = 10
-            if last_date and (today - last_date).days == 1:
-                streak += 1
-            else:
-                streak = 1
-        db["user"].update_one(
-            {"_id": payload.user_id},
-            {"$set": {"last_completed_at": datetime.now(timezone.utc), "streak": streak},
-             "$inc": {"xp": xp_gain}},
-        )
+async def _record_reflection(adb, payload: ReflectionRequest, claim: Optional[Claim]) -> dict:
+    ref_doc = new_document(ReflectionSchema(**payload.model_dump()))
+    if claim is not None:
+        ref_doc["_id"] = claim.resource_id
+    reflection_id = str(ref_doc["_id"])
+
+    queued = False
+    if claim is not None and not claim.first:
+        # A failed earlier attempt may have stored it; XP is awarded at most once
+        if not await upsert_document_async("reflection", ref_doc):
+            user_doc = await find_one_async("user", {"_id": ids.decode(payload.user_id)}, {"xp": 1, "streak": 1})
+            if not user_doc:
+                return {"reflection_id": reflection_id}
+            xp, streak = user_doc.get("xp", 0), user_doc.get("streak", 0)
+            return {"reflection_id": reflection_id, "xp": xp, "streak": streak, "badges": compute_badges(xp, streak)}
     else:
+        # Write-behind mode: the insert and its rollup go out with the next flush
+        queued = reflection_writer is not None and await reflection_writer.submit(ref_doc)
+        if not queued:
+            await insert_document_async("reflection", ref_doc)
+    gallery_feed.add(ref_doc)
+
+    # Update XP and streak in one atomic round trip; the server evaluates
+    # the streak rules against its own clock, so double submits cannot race.
+    writes = [
+        find_one_and_update_async(
+            "user", {"_id": ids.decode(payload.user_id)}, COMPLETION_PIPELINE, projection={"xp": 1, "streak": 1}
+        )
+    ]
+    if not queued:
+        # The stats rollup is an independent $inc upsert, sent alongside
+        writes.append(rollups.record(adb, [ref_doc]))
+    user_doc, *_ = await asyncio.gather(*writes)
+    if not user_doc:
         # If somehow user not found, ignore for MVP
-        pass
+        return {"reflection_id": reflection_id}
+
+    xp = user_doc.get("xp", 0)
+    streak = user_doc.get("streak", 0)
+    badges = compute_badges(xp, streak)
+    leaderboards.record(payload.user_id, xp, streak)
+    profile_cache.update(
+        payload.user_id,
+        lambda p: {
+            **p,
+            "user": {**p["user"], "xp": xp, "streak": streak},
+            "badges": badges,
+            "recent_reflections": [_profile_reflection(ref_doc)] + p["recent_reflections"][:RECENT_REFLECTIONS - 1],
+        },
+    )
+    return {"reflection_id": reflection_id, "xp": xp, "streak": streak, "badges": badges}
+
+
+def _replayed(user_doc: dict, completions: List[datetime]) -> Tuple[Optional[datetime], int, int]:
+    """(last_completed_at, streak, XP gained) after replaying `completions`, in time order, onto user_doc"""
+    last, streak, xp = user_doc.get("last_completed_at"), user_doc.get("streak", 0), 0
+    for when in completions:
+        xp_gain, streak = apply_completion(last, streak, when)
+        xp += xp_gain
+        if last is None or when > (last if last.tzinfo else last.replace(tzinfo=timezone.utc)):
+            last = when
+    return last, streak, xp
+
+
+async def _replay_completions(adb, users: Dict[str, dict], completions: Dict[str, List[datetime]]) -> Dict[str, Tuple[int, int]]:
+    """Apply every user's replayed completions in one bulk_write; {user_id: (xp, streak)} after
+
+    Each update only matches while last_completed_at is still the value the
+    streak was computed from, so a /reflect landing in between is never
+    overwritten. If fewer updates match than were sent, the users are
+    re-read: the batch id each update pushes onto replayed_batches shows
+    whose update applied, and only the others are recomputed and resent.
+    Users deleted meanwhile are left out.
+    """
+    batch_id = ObjectId()
+    pending = {uid: users[uid] for uid in completions}
+    results = {}
+    for _ in range(BATCH_UPDATE_ATTEMPTS):
+        planned = {uid: _replayed(doc, completions[uid]) for uid, doc in pending.items()}
+        requests = [
+            UpdateOne(
+                {"_id": ids.decode(uid), "last_completed_at": pending[uid].get("last_completed_at")},
+                {
+                    "$set": {"last_completed_at": last, "streak": streak},
+                    "$inc": {"xp": xp},
+                    "$push": {"replayed_batches": {"$each": [batch_id], "$slice": -REPLAYED_BATCHES}},
+                },
+            )
+            for uid, (last, streak, xp) in planned.items()
+        ]
+        result = await adb["user"].bulk_write(requests, ordered=False)
+        applied, missed = set(pending), {}
+        if result.matched_count < len(requests):
+            fresh = await get_documents_async(
+                "user", {"_id": {"$in": ids.decode_many(pending)}}, projection={**STREAK_FIELDS, "replayed_batches": 1}
+            )
+            applied = {ids.encode(u["_id"]) for u in fresh if batch_id in u.get("replayed_batches", ())}
+            missed = {ids.encode(u["_id"]): u for u in fresh if ids.encode(u["_id"]) not in applied}
+        for uid in applied:
+            _, streak, xp = planned[uid]
+            results[uid] = (pending[uid].get("xp", 0) + xp, streak)
+        if not missed:
+            return results
+        pending = missed
+    raise HTTPException(503, "Too many concurrent updates for these users; retry the batch")
+
+
+@app.post("/reflect/batch")
+async def submit_reflection_batch(payload: List[QueuedReflectionRequest]):
+    # Replay of reflections queued offline: one insert_many, one user read,
+    # then one bulk_write of guarded per-user updates (sent alongside the
+    # rollup bulk_write), with streaks computed as if submitted one by one.
+    adb = get_async_db()
+    if adb is None:
+        raise HTTPException(500, "Database not configured")
+    if len(payload) > MAX_REFLECTION_BATCH:
+        raise HTTPException(400, f"At most {MAX_REFLECTION_BATCH} reflections per batch")
+    if not payload:
+        return {"reflection_ids": []}
+
+    now = datetime.now(timezone.utc)
+    completed = [p.completed_at or now for p in payload]
+    # Future client clocks are clamped so replays cannot jump ahead of $$NOW
+    completed = [min(c if c.tzinfo else c.replace(tzinfo=timezone.utc), now) for c in completed]
+
+    docs = await insert_documents_async(
+        "reflection",
+        [
+            {**ReflectionSchema(**p.model_dump(exclude={"completed_at"})).model_dump(), "created_at": when}
+            for p, when in zip(payload, completed)
+        ],
+    )
+    for d in docs:
+        gallery_feed.add(d)
+
+    user_ids = list({p.user_id for p in payload})
+    users = {
+        ids.encode(u["_id"]): u
+        for u in await get_documents_async("user", {"_id": {"$in": ids.decode_many(user_ids)}}, projection=STREAK_FIELDS)
+    }
+    completions = {}
+    for when, p in sorted(zip(completed, payload), key=lambda pair: pair[0]):
+        # Unknown users are ignored, as in /reflect
+        if p.user_id in users:
+            completions.setdefault(p.user_id, []).append(when)
+
+    results, _ = await asyncio.gather(_replay_completions(adb, users, completions), rollups.record(adb, docs))
+    for uid, result in results.items():
+        leaderboards.record(uid, *result)
+    for uid in user_ids:
+        profile_cache.invalidate(uid)
 
-    return {"reflection_id": reflection_id}
+    return ORJSONResponse({"reflection_ids": [d["_id"] for d in docs]})
 
 
 @app.get("/user/{user_id}/profile")
-def get_profile(user_id: str):
-    if db is None:
+async def get_profile(user_id: str):
+    adb = get_async_db()
+    if adb is None:
         raise HTTPException(500, "Database not configured")
-    user = db["user"].find_one({"_id": user_id})
+    cached = profile_cache.get(user_id)
+    if cached is not None:
+        # Ranks move with everyone else's progress, so they are never cached
+        return ORJSONResponse({**cached, "rank": leaderboards.ranks(user_id)})
+
+    user = await find_one_async("user", {"_id": _user_oid(user_id)}, PROFILE_USER_FIELDS)
     if not user:
         raise HTTPException(404, "User not found")
 
     # Compute badges
     xp = user.get("xp", 0)
     streak = user.get("streak", 0)
-    badges = [b for b in BADGES if xp >= b["requirement"] or streak >= b["requirement"]]
+    badges = compute_badges(xp, streak)
 
     # Last 5 reflections
-    refs = list(db["reflection"].find({"user_id": user_id}).sort("created_at", -1).limit(5))
+    refs = await (
+        adb["reflection"].find({"user_id": user_id}, PROFILE_REFLECTION_FIELDS).sort("created_at", -1)
+        .limit(RECENT_REFLECTIONS).to_list(length=RECENT_REFLECTIONS)
+    )
 
-    return {
+    profile = {
         "user": {
             "_id": user_id,
             "name": user.get("name"),
@@ -255,41 +694,184 @@ def get_profile(user_id: str):
             "streak": streak,
         },
         "badges": badges,
-        "recent_reflections": [
-            {
-                "id": str(r.get("_id")),
-                "challenge_id": r.get("challenge_id"),
-                "mood_before": r.get("mood_before"),
-                "mood_after": r.get("mood_after"),
-                "note": r.get("note"),
-                "created_at": r.get("created_at"),
-            }
-            for r in refs
-        ],
+        "recent_reflections": [_profile_reflection(r) for r in refs],
+    }
+    profile_cache.set(user_id, profile)
+    return ORJSONResponse({**profile, "rank": leaderboards.ranks(user_id)})
+
+
+@app.get("/user/{user_id}/reflections/export")
+async def export_reflections(user_id: str, format: str = "ndjson", batch_size: int = EXPORT_BATCH_SIZE):
+    adb = get_async_db()
+    if adb is None:
+        raise HTTPException(500, "Database not configured")
+    if format not in export.MEDIA_TYPES:
+        raise HTTPException(400, "format must be ndjson or csv")
+    if not await find_one_async("user", {"_id": _user_oid(user_id)}, {"_id": 1}):
+        raise HTTPException(404, "User not found")
+    return StreamingResponse(
+        export.stream_reflections(adb, user_id, format, batch_size=max(1, min(batch_size, 10_000))),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="reflections-{user_id}.{format}"'},
+    )
+
+
+@app.get("/user/{user_id}/stats")
+async def get_user_stats(user_id: str):
+    adb = get_async_db()
+    if adb is None:
+        raise HTTPException(500, "Database not configured")
+    return ORJSONResponse(await user_stats(adb, user_id))
+
+
+def _profile_reflection(r: dict) -> dict:
+    return {
+        "id": r.get("_id"),
+        "challenge_id": r.get("challenge_id"),
+        "mood_before": r.get("mood_before"),
+        "mood_after": r.get("mood_after"),
+        "note": r.get("note"),
+        "created_at": r.get("created_at"),
     }
 
 
+# ----------------------
+# Groups
+# ----------------------
+
+@app.post("/group")
+async def create_group(payload: CreateGroupRequest):
+    adb = get_async_db()
+    if adb is None:
+        raise HTTPException(500, "Database not configured")
+    group_id = str(ObjectId())
+    if payload.code:
+        code = joincodes.normalize(payload.code)
+        if not joincodes.well_formed(code):
+            raise HTTPException(422, "Group codes are 4-12 letters or digits")
+        if not await join_codes.reserve(adb, code, group_id):
+            raise HTTPException(409, "Group code already taken")
+    else:
+        code = await join_codes.allocate(adb, group_id)
+    try:
+        return await groups.create_group(adb, payload.name, payload.owner_id, code, group_id=group_id)
+    except DuplicateKeyError:
+        await join_codes.release(adb, code, group_id)
+        raise HTTPException(409, "Group code already taken")
+
+@app.post("/group/join")
+async def join_group(payload: JoinGroupRequest):
+    adb = get_async_db()
+    if adb is None:
+        raise HTTPException(500, "Database not configured")
+    group_id = await join_codes.resolve(adb, payload.code)
+    group = await groups.join_group(adb, group_id, payload.user_id) if group_id else None
+    if group is None:
+        raise HTTPException(404, "No group with that code")
+    return group
+
+@app.get("/user/{user_id}/groups")
+async def list_user_groups(user_id: str):
+    adb = get_async_db()
+    if adb is None:
+        raise HTTPException(500, "Database not configured")
+    return await groups.groups_for_user(adb, user_id)
+
+@app.post("/group/{group_id}/challenge")
+async def set_group_challenge(group_id: str, payload: GroupChallengeRequest):
+    adb = get_async_db()
+    if adb is None:
+        raise HTTPException(500, "Database not configured")
+    if challenge_catalog.get(payload.challenge_id) is None:
+        raise HTTPException(404, "Challenge not found")
+    try:
+        group = await groups.set_group_challenge(adb, group_id, payload.user_id, payload.challenge_id)
+    except PermissionError as e:
+        raise HTTPException(403, str(e))
+    if group is None:
+        raise HTTPException(404, "Group not found")
+    return group
+
+@app.get("/group/{group_id}/feed")
+async def group_feed(group_id: str, limit: int = 20):
+    adb = get_async_db()
+    if adb is None:
+        raise HTTPException(500, "Database not configured")
+    items = await groups.group_feed(adb, group_id, limit=max(1, min(limit, 50)))
+    if items is None:
+        raise HTTPException(404, "Group not found")
+    return ORJSONResponse(items)
+
+
+# ----------------------
+# Leaderboard
+# ----------------------
+
+@app.get("/leaderboard")
+async def get_leaderboard(by: str = "xp", window: str = "all", limit: int = 10, offset: int = 0):
+    if window not in Leaderboards.WINDOWS.get(by, ()):
+        raise HTTPException(400, f"Unsupported leaderboard by={by} window={window}")
+    board = leaderboards.board(by, window)
+    limit = max(1, min(limit, 100))
+    return ORJSONResponse({
+        "by": by,
+        "window": window,
+        "total": len(board),
+        "entries": [
+            {"rank": rank, "user_id": uid, "name": leaderboards.names.get(uid), "score": score}
+            for rank, uid, score in board.top(limit, max(0, offset))
+        ],
+    })
+
+
 # ----------------------
 # Joy Gallery (public feed)
 # ----------------------
 
 @app.get("/gallery")
-def gallery(limit: int = 20):
-    if db is None:
+async def gallery(limit: int = 20, before: Optional[str] = None):
+    # `before` is the "<epoch ms>,<id>" of the last item already seen;
+    # the next cursor is also returned in the X-Next-Cursor header.
+    adb = get_async_db()
+    if adb is None:
         raise HTTPException(500, "Database not configured")
-    docs = list(
-        db["reflection"].find({"is_public": True}).sort("created_at", -1).limit(min(limit, 50))
-    )
-    return [
-        {
-            "id": str(d.get("_id")),
-            "challenge_id": d.get("challenge_id"),
-            "note": d.get("note"),
-            "mood_after": d.get("mood_after"),
-            "created_at": d.get("created_at"),
-        }
-        for d in docs
-    ]
+    try:
+        body, next_cursor = await gallery_feed.page_json(adb, limit=limit, before=before)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    return json_bytes_response(body, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+
+
+# ----------------------
+# Diagnostics
+# ----------------------
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/debug/cache")
+async def cache_stats():
+    return {"profile": profile_cache.stats(), "join_codes": join_codes.stats(), "idempotency": idempotency.stats()}
+
+
+@app.get("/debug/pool")
+async def pool_stats():
+    return database.pool_monitor.stats()
+
+
+@app.get("/debug/slow-queries")
+async def slow_query_log(limit: int = 50):
+    return ORJSONResponse({**slow_queries.stats(), "entries": slow_queries.entries(max(1, min(limit, 200)))})
+
+
+@app.get("/debug/write-behind")
+async def write_behind_stats():
+    if reflection_writer is None:
+        return {"enabled": False}
+    return {"enabled": True, **reflection_writer.stats()}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,207 @@
+"""
+Metrics
+
+Per-route request latency, requests in flight and per-collection MongoDB
+command timings, rendered in the Prometheus text format at /metrics.
+
+Histograms are sharded per thread: each thread records into its own
+series dict, so the hot path takes no lock (only a thread's first sample
+registers its shard) and Motor's executor threads never contend with the
+event loop. A scrape sums the shards; a sample landing mid-scrape may be
+counted in _count before _sum, which Prometheus tolerates.
+
+Routes are labelled with their template ("/user/{user_id}/profile"), not
+the raw path, so label cardinality stays bounded.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence
+
+from pymongo import monitoring
+
+# Upper bounds in seconds; a final +Inf bucket is implied
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Starlette appends the charset
+
+# ASGI scope of the request being served; Motor copies the context into its
+# executor threads, so command listeners can see which request issued a command
+request_scope: ContextVar[Optional[dict]] = ContextVar("request_scope", default=None)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Fixed-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.bounds = tuple(buckets)
+        self._local = threading.local()
+        self._shards: List[Dict[tuple, list]] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> Dict[tuple, list]:
+        series = {}
+        with self._lock:
+            self._shards.append(series)
+        self._local.series = series
+        return series
+
+    def observe(self, labels: tuple, value: float) -> None:
+        try:
+            series = self._local.series
+        except AttributeError:
+            series = self._shard()
+        cell = series.get(labels)
+        if cell is None:
+            # bucket counts, then the +Inf overflow, then the sum
+            cell = series[labels] = [0] * (len(self.bounds) + 1) + [0.0]
+        cell[bisect_left(self.bounds, value)] += 1
+        cell[-1] += value
+
+    def snapshot(self) -> Dict[tuple, list]:
+        """Shards summed per label set: [per-bucket counts..., overflow, sum]"""
+        with self._lock:
+            shards = list(self._shards)
+        merged: Dict[tuple, list] = {}
+        for series in shards:
+            for labels, cell in list(series.items()):
+                total = merged.get(labels)
+                if total is None:
+                    merged[labels] = list(cell)
+                else:
+                    for i, v in enumerate(cell):
+                        total[i] += v
+        return merged
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, cell in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), cell):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {cell[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """A single value; only ever changed from the event loop thread"""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.value}"]
+
+
+http_latency = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"), HTTP_BUCKETS
+)
+http_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+mongo_latency = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command latency by collection",
+    ("collection", "command", "outcome"),
+    MONGO_BUCKETS,
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and in-flight requests, and binding request_scope
+
+    Plain ASGI rather than BaseHTTPMiddleware, which would add a task and
+    a memory stream per request. Streaming responses are timed until
+    their last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        http_in_flight.value += 1
+        token = request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            request_scope.reset(token)
+            http_in_flight.value -= 1
+            # FastAPI puts the matched route on the scope
+            route = scope.get("route")
+            http_latency.observe(
+                (scope["method"], getattr(route, "path", UNMATCHED_ROUTE), str(status[0])),
+                time.perf_counter() - start,
+            )
+
+
+def command_collection(command_name: str, command) -> str:
+    """Collection a command targets, or "" for database-level commands"""
+    target = command.get("collection") if command_name == "getMore" else command.get(command_name)
+    return target if isinstance(target, str) else ""
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Feeds mongo_latency from PyMongo command monitoring events"""
+
+    def __init__(self, histogram: Histogram = mongo_latency):
+        self.histogram = histogram
+        # request_id -> collection, for commands in flight; the completion
+        # events do not carry the command. Single dict operations are atomic.
+        self._collections: Dict[int, str] = {}
+
+    def started(self, event):
+        self._collections[event.request_id] = command_collection(event.command_name, event.command)
+
+    def succeeded(self, event):
+        self._record(event, "ok")
+
+    def failed(self, event):
+        self._record(event, "error")
+
+    def _record(self, event, outcome: str) -> None:
+        collection = self._collections.pop(event.request_id, "")
+        self.histogram.observe((collection, event.command_name, outcome), event.duration_micros / 1e6)
+
+
+command_timer = CommandTimer()
+
+
+def render() -> bytes:
+    lines: List[str] = []
+    for metric in (http_latency, http_in_flight, mongo_latency):
+        lines.extend(metric.render())
+    return ("\n".join(lines) + "\n").encode()
+
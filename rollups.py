@@ -0,0 +1,172 @@
+"""
+Per-user reflection rollups
+
+One `user_rollup` document per user (_id = user_id) holds running totals
+that /reflect and /reflect/batch maintain with $inc in the same request
+as the reflection insert, so stats read a single document instead of
+scanning reflections:
+
+    count, mood_before_sum, mood_after_sum
+    delta_counts.<mood_after - mood_before>
+    mood_after_counts.<1..5>
+    days.<YYYY-MM-DD>                       completions per UTC day
+    challenges.<key>.{challenge_id, count, mood_before_sum, mood_after_sum}
+
+A rollup is only trusted for stats once it is marked `complete: true`,
+meaning it covers every reflection the user has: rebuild() writes complete
+rollups, and signup creates an empty complete one (a new user has no
+history). A rollup that /reflect upserted for a user who predates rollups
+holds only recent reflections, so stats keep using the aggregation
+fallback for that user until a rebuild backfills them.
+
+Rollups can be rebuilt from raw reflections, streaming in user_id order so
+only one user's totals are held in memory at a time:
+
+    python rollups.py rebuild [--user USER_ID] [--batch-size 1000]
+
+A rebuild replaces rollups wholesale; increments that land for a user
+while that user is being rebuilt are lost, so run it in a quiet window.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable
+
+from pymongo import ReplaceOne, UpdateOne
+
+ROLLUP_COLLECTION = "user_rollup"
+
+
+def _key(value) -> str:
+    # Field names cannot contain "." or start with "$"
+    return str(value).replace(".", "_").replace("$", "_")
+
+
+def _day(created_at) -> str:
+    if not isinstance(created_at, datetime):
+        created_at = datetime.now(timezone.utc)
+    elif created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    # Naive datetimes from PyMongo are already UTC
+    return created_at.strftime("%Y-%m-%d")
+
+
+def increments(reflection: dict) -> Dict[str, int]:
+    """$inc fields contributed by one stored reflection"""
+    before, after = reflection["mood_before"], reflection["mood_after"]
+    challenge = f"challenges.{_key(reflection['challenge_id'])}"
+    return {
+        "count": 1,
+        "mood_before_sum": before,
+        "mood_after_sum": after,
+        f"delta_counts.{after - before}": 1,
+        f"mood_after_counts.{after}": 1,
+        f"days.{_day(reflection.get('created_at'))}": 1,
+        f"{challenge}.count": 1,
+        f"{challenge}.mood_before_sum": before,
+        f"{challenge}.mood_after_sum": after,
+    }
+
+
+def rollup_updates(reflections: Iterable[dict]) -> list:
+    """One upserting UpdateOne per user covering all of `reflections`"""
+    incs: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    names: Dict[str, Dict[str, str]] = defaultdict(dict)
+    for r in reflections:
+        for field, amount in increments(r).items():
+            incs[r["user_id"]][field] += amount
+        names[r["user_id"]][f"challenges.{_key(r['challenge_id'])}.challenge_id"] = r["challenge_id"]
+    return [
+        UpdateOne({"_id": user_id}, {"$inc": dict(inc), "$set": names[user_id]}, upsert=True)
+        for user_id, inc in incs.items()
+    ]
+
+
+async def record(adb, reflections: Iterable[dict]) -> None:
+    """Fold stored reflections into their users' rollups in one round trip"""
+    updates = rollup_updates(reflections)
+    if updates:
+        await adb[ROLLUP_COLLECTION].bulk_write(updates, ordered=False)
+
+
+async def create(adb, user_id: str) -> None:
+    """Start a brand-new user's rollup; complete, since there is no history to miss"""
+    empty = _empty(user_id)
+    del empty["_id"]
+    await adb[ROLLUP_COLLECTION].update_one({"_id": user_id}, {"$setOnInsert": empty}, upsert=True)
+
+
+def _empty(user_id: str) -> dict:
+    return {
+        "_id": user_id,
+        "complete": True,
+        "count": 0,
+        "mood_before_sum": 0,
+        "mood_after_sum": 0,
+        "delta_counts": {},
+        "mood_after_counts": {},
+        "days": {},
+        "challenges": {},
+    }
+
+
+def _fold(rollup: dict, reflection: dict) -> None:
+    # Same arithmetic as increments(), applied to an in-memory document
+    for field, amount in increments(reflection).items():
+        *path, leaf = field.split(".")
+        node = rollup
+        for part in path:
+            node = node.setdefault(part, {})
+        node[leaf] = node.get(leaf, 0) + amount
+    rollup["challenges"][_key(reflection["challenge_id"])]["challenge_id"] = reflection["challenge_id"]
+
+
+def rebuild(db, user_id: str = None, batch_size: int = 1000) -> int:
+    """Recompute rollups from raw reflections; returns the number of users written"""
+    query = {"user_id": user_id} if user_id else {}
+    projection = {"_id": 0, "user_id": 1, "challenge_id": 1, "mood_before": 1, "mood_after": 1, "created_at": 1}
+    cursor = db["reflection"].find(query, projection).sort("user_id", 1).batch_size(batch_size)
+
+    pending, written, current = [], 0, None
+    for r in cursor:
+        if current is None or current["_id"] != r["user_id"]:
+            if current is not None:
+                pending.append(ReplaceOne({"_id": current["_id"]}, current, upsert=True))
+            current = _empty(r["user_id"])
+            if len(pending) >= batch_size:
+                db[ROLLUP_COLLECTION].bulk_write(pending, ordered=False)
+                written += len(pending)
+                pending = []
+        _fold(current, r)
+    if current is not None:
+        pending.append(ReplaceOne({"_id": current["_id"]}, current, upsert=True))
+    if pending:
+        db[ROLLUP_COLLECTION].bulk_write(pending, ordered=False)
+        written += len(pending)
+    if user_id and current is None:
+        # No reflections left for this user
+        db[ROLLUP_COLLECTION].delete_one({"_id": user_id})
+    return written
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    from database import get_db
+
+    parser = argparse.ArgumentParser(description="Rebuild per-user reflection rollups")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--user", help="only rebuild this user_id")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    if db is None:
+        print("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+        return 2
+    print(f"rebuilt {rebuild(db, args.user, args.batch_size)} rollups")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
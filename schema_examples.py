@@ -6,7 +6,7 @@ Copy and modify these examples for your specific needs.
 """
 
 from datetime import datetime
-from database import create_document, get_documents, update_document, delete_document
+from database import create_document, find_document, iter_documents, sort_key, update_document, delete_document
 
 # =============================================================================
 # USER MANAGEMENT SCHEMA
@@ -33,8 +33,7 @@ def create_user(name: str, email: str, password_hash: str):
 
 def get_user_by_email(email: str):
     """Get user by email"""
-    users = get_documents("users", {"email": email})
-    return users[0] if users else None
+    return find_document("users", {"email": email})
 
 # =============================================================================
 # BLOG/CMS SCHEMA
@@ -266,6 +265,20 @@ def track_user_activity(user_id: str, action: str, resource_type: str, resource_
     }
     return create_document("user_activities", activity_data)
 
+def get_user_activity_page(user_id: str, limit: int = 50, after: tuple = None):
+    """One page of a user's activity, newest first, plus the cursor for the next page"""
+    sort = [("timestamp", -1), ("_id", -1)]
+    page = list(iter_documents(
+        "user_activities",
+        {"user_id": user_id},
+        projection={"action": 1, "resource_type": 1, "resource_id": 1, "timestamp": 1},
+        sort=sort,
+        limit=limit,
+        after=after,
+    ))
+    next_after = sort_key(page[-1], sort) if len(page) == limit else None
+    return page, next_after
+
 def track_page_view(page_path: str, user_id: str = None, session_id: str = None):
     """Track page views for analytics"""
     pageview_data = {
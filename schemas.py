@@ -6,13 +6,16 @@ name is the lowercase class name by convention in this environment.
 
 Collections defined:
 - User -> "user"
-- Challenge -> "challenge" (for future dynamic packs; static list used for now)
+- Challenge -> "challenge" (served from an in-memory snapshot; built-in seeds while empty)
 - Reflection -> "reflection"
 - Group -> "group"
+- GroupMember -> "groupmember" (one document per membership, so groups can grow large)
+- JoinCode -> "joincode" (pre-generated group join codes, claimed atomically)
+- IdempotencyKey -> "idempotencykey" (Idempotency-Key records, expired by TTL)
 """
 
 from pydantic import BaseModel, Field
-from typing import Optional, List, Literal
+from typing import Any, Optional, Literal
 from datetime import datetime
 
 Mode = Literal["casual", "challenge"]
@@ -47,5 +50,26 @@ class Group(BaseModel):
     name: str
     code: str
     owner_id: str
-    member_ids: List[str] = Field(default_factory=list)
+    member_count: int = Field(0, ge=0, description="Maintained with $inc on join")
     current_challenge_id: Optional[str] = None
+    challenge_assigned_at: Optional[datetime] = Field(None, description="Group feed starts here")
+
+class GroupMember(BaseModel):
+    """_id is "<group_id>:<user_id>", which makes joining idempotent"""
+    group_id: str
+    user_id: str
+    current_challenge_id: Optional[str] = Field(None, description="Fanned out from the group")
+    assigned_at: Optional[datetime] = None
+
+class JoinCode(BaseModel):
+    """_id is the code itself; unclaimed while group_id is null"""
+    group_id: Optional[str] = Field(None, description="Group the code was claimed for")
+    claimed_at: Optional[datetime] = None
+
+class IdempotencyKey(BaseModel):
+    """_id is "<scope>:<key>"; created_at drives the TTL index"""
+    fingerprint: str = Field(..., description="sha256 of the request body")
+    resource_id: Any = Field(..., description="_id the write targets, stored as an ObjectId")
+    response: Optional[dict] = Field(None, description="Stored once the request completes")
+    locked_until: datetime
+    created_at: datetime = Field(..., description="When the key was first used")
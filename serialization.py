@@ -0,0 +1,49 @@
+"""
+JSON serialization
+
+orjson-backed encoding for API responses. ObjectId is written as its hex
+string and datetimes as RFC 3339; naive datetimes (as PyMongo returns
+them) are treated as UTC. Other mappings (e.g. RawBSONDocument) are
+encoded like dicts.
+
+ORJSONResponse is the app's default response class. FastAPI still runs
+jsonable_encoder over plain return values first, so hot endpoints return
+an ORJSONResponse (or pre-serialized bytes via json_bytes_response) to
+skip that pass as well.
+"""
+
+from collections.abc import Mapping
+from typing import Iterable, Optional
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse, Response
+
+_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj) -> bytes:
+    return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+
+def join_array(fragments: Iterable[bytes]) -> bytes:
+    """JSON array from already-encoded elements"""
+    return b"[" + b",".join(fragments) + b"]"
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def json_bytes_response(body: bytes, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """Response for a body that is already encoded JSON"""
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
@@ -0,0 +1,277 @@
+"""
+Slow query log
+
+A PyMongo CommandListener on the app's client flags every command that
+takes longer than `threshold_ms`. Each entry records:
+
+- the collection, command name, duration and outcome
+- the query shape: filter / sort / pipeline with every value replaced by
+  "?", so entries can be grouped and shared without leaking user data
+- the endpoint that issued it (route template and handler name), taken
+  from metrics.request_scope; commands from background tasks have none
+- documents returned (from the reply) and, for a sample of entries,
+  documents and keys examined plus the winning plan's stages (from an
+  executionStats explain)
+
+Entries go to a rotating JSON-lines log and to an in-memory ring served
+at /debug/slow-queries.
+
+The listener never talks to MongoDB itself (a command issued from inside a
+listener would recurse into it and block the driver's thread). It queues
+the sampled candidates, and run() explains them from the event loop. The
+same shape is explained at most once per `explain_cooldown` seconds, since
+explain with executionStats re-runs the query.
+"""
+
+import asyncio
+import logging
+import logging.handlers
+import os
+import random
+import time
+from collections import deque
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional, Tuple
+
+import orjson
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+
+from metrics import command_collection, request_scope
+
+logger = logging.getLogger(__name__)
+
+# Commands whose filter is worth a shape and which explain can re-run
+# without side effects
+EXPLAINABLE = frozenset({"find", "aggregate", "count", "distinct"})
+# Keep sort specs verbatim: field names and directions carry no user data
+_VERBATIM = frozenset({"sort", "$sort"})
+_SHAPE_FIELDS = ("filter", "query", "sort", "pipeline", "hint")
+
+
+def _field(key: str, value):
+    return dict(value) if key in _VERBATIM and isinstance(value, Mapping) else redact(value)
+
+
+def redact(value):
+    """Shape of a filter or pipeline: keys kept, every value replaced by "?" """
+    if isinstance(value, Mapping):
+        return {k: _field(k, v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)) and value and all(isinstance(v, Mapping) for v in value):
+        # $and / $or branches and pipeline stages keep their structure
+        return [redact(v) for v in value]
+    return "?"
+
+
+def query_shape(command_name: str, command) -> dict:
+    shape = {field: _field(field, command[field]) for field in _SHAPE_FIELDS if field in command}
+    for field in ("updates", "deletes"):
+        statements = command.get(field)
+        if statements:
+            shape["q"] = redact(statements[0].get("q", {}))
+    return shape
+
+
+def docs_returned(reply) -> Optional[int]:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, Mapping):
+        batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+        return len(batch) if batch is not None else None
+    n = reply.get("n")
+    return n if isinstance(n, int) else None
+
+
+def endpoint(scope: Optional[dict]) -> Optional[str]:
+    if scope is None:
+        return None
+    route = scope.get("route")
+    if route is None:
+        return f"{scope.get('method')} {scope.get('path')}"
+    handler = getattr(getattr(route, "endpoint", None), "__name__", "?")
+    return f"{scope.get('method')} {route.path} ({handler})"
+
+
+def _find(doc, key: str):
+    """First value stored under `key` anywhere in an explain document"""
+    if isinstance(doc, Mapping):
+        if key in doc:
+            return doc[key]
+        children = doc.values()
+    elif isinstance(doc, list):
+        children = doc
+    else:
+        return None
+    for child in children:
+        found = _find(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def plan_stages(plan) -> List[str]:
+    """Stage names of a winning plan, outermost first (e.g. SORT, COLLSCAN)"""
+    stages: List[str] = []
+    pending = [plan]
+    while pending:
+        node = pending.pop(0)
+        if not isinstance(node, Mapping):
+            continue
+        if "stage" in node:
+            stages.append(node["stage"])
+        for child in ("queryPlan", "inputStage"):
+            if child in node:
+                pending.append(node[child])
+        pending.extend(node.get("inputStages", []))
+    return stages
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Flags commands slower than threshold_ms; see the module docstring"""
+
+    def __init__(
+        self,
+        threshold_ms: float = 100.0,
+        explain_sample: float = 0.1,
+        explain_cooldown: float = 300.0,
+        recent: int = 200,
+        path: Optional[str] = None,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+    ):
+        self.threshold_us = threshold_ms * 1000
+        self.explain_sample = explain_sample
+        self.explain_cooldown = explain_cooldown
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.recent: Deque[dict] = deque(maxlen=recent)
+        self.flagged = 0
+        self.explained = 0
+
+        # request_id -> (started event, request scope) for commands in flight
+        self._started: Dict[int, Tuple[object, Optional[dict]]] = {}
+        # (entry, database, command) awaiting explain; appends are thread-safe
+        self._to_explain: Deque[Tuple[dict, str, dict]] = deque(maxlen=100)
+        self._explained_at: Dict[str, float] = {}
+        self._file: Optional[logging.Logger] = None
+
+    def open(self) -> None:
+        """Start writing entries to the rotating log file"""
+        if not self.path or self._file is not None:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            self.path, maxBytes=self.max_bytes, backupCount=self.backup_count
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        file_logger = logging.getLogger(f"{__name__}.file")
+        file_logger.setLevel(logging.INFO)
+        file_logger.propagate = False
+        file_logger.addHandler(handler)
+        self._file = file_logger
+
+    def close(self) -> None:
+        if self._file is not None:
+            for handler in list(self._file.handlers):
+                self._file.removeHandler(handler)
+                handler.close()
+            self._file = None
+
+    # -- listener --
+
+    def started(self, event):
+        if event.command_name == "explain":
+            return  # our own explains
+        self._started[event.request_id] = (event, request_scope.get())
+
+    def succeeded(self, event):
+        self._finished(event, "ok", event.reply)
+
+    def failed(self, event):
+        self._finished(event, "error", {})
+
+    def _finished(self, event, outcome: str, reply) -> None:
+        started = self._started.pop(event.request_id, None)
+        if started is None or event.duration_micros < self.threshold_us:
+            return
+        start_event, scope = started
+        command = start_event.command
+        name = event.command_name
+        entry = {
+            "at": datetime.now(timezone.utc),
+            "endpoint": endpoint(scope),
+            "collection": command_collection(name, command),
+            "command": name,
+            "duration_ms": round(event.duration_micros / 1000, 3),
+            "outcome": outcome,
+            "shape": query_shape(name, command),
+            "docs_returned": docs_returned(reply),
+            "docs_examined": None,
+            "keys_examined": None,
+            "plan": None,
+        }
+        self.flagged += 1
+        self.recent.append(entry)
+        if name in EXPLAINABLE and random.random() < self.explain_sample:
+            # Written once the explain has filled in the examined counts
+            self._to_explain.append((entry, start_event.database_name, command))
+        else:
+            self._write(entry)
+
+    # -- explain --
+
+    def _write(self, entry: dict) -> None:
+        if self._file is not None:
+            self._file.info(orjson.dumps(entry).decode())
+
+    async def explain(self, adb, entry: dict, database: str, command) -> None:
+        """Fill in docs/keys examined and the plan for one flagged command"""
+        key = f"{entry['collection']}:{entry['command']}:{orjson.dumps(entry['shape']).decode()}"
+        now = time.monotonic()
+        if now - self._explained_at.get(key, float("-inf")) < self.explain_cooldown:
+            return
+        self._explained_at[key] = now
+        # Session, cluster time and $db belong to the original request
+        inner = {k: v for k, v in command.items() if not k.startswith("$") and k not in ("lsid", "txnNumber")}
+        result = await adb.client[database].command({"explain": inner, "verbosity": "executionStats"})
+        stats = _find(result, "executionStats") or {}
+        entry["docs_examined"] = stats.get("totalDocsExamined")
+        entry["keys_examined"] = stats.get("totalKeysExamined")
+        entry["plan"] = plan_stages(_find(result, "winningPlan"))
+        self.explained += 1
+
+    async def run(self, adb, interval: float = 1.0) -> None:
+        """Explain queued candidates until cancelled"""
+        while True:
+            while self._to_explain:
+                entry, database, command = self._to_explain.popleft()
+                try:
+                    await self.explain(adb, entry, database, command)
+                except PyMongoError as e:
+                    logger.warning("Slow query explain on %s failed: %s", entry["collection"], e)
+                self._write(entry)
+            await asyncio.sleep(interval)
+
+    def entries(self, limit: int = 50) -> List[dict]:
+        """Most recent entries, newest first"""
+        return list(self.recent)[::-1][:limit]
+
+    def stats(self) -> dict:
+        return {
+            "threshold_ms": self.threshold_us / 1000,
+            "explain_sample": self.explain_sample,
+            "flagged": self.flagged,
+            "explained": self.explained,
+            "awaiting_explain": len(self._to_explain),
+        }
+
+
+slow_queries = SlowQueryLog(
+    threshold_ms=float(os.getenv("SLOW_QUERY_MS", 100)),
+    explain_sample=float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE", 0.1)),
+    explain_cooldown=float(os.getenv("SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS", 300)),
+    path=os.getenv("SLOW_QUERY_LOG", "logs/slow-queries.log"),
+    max_bytes=int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024)),
+    backup_count=int(os.getenv("SLOW_QUERY_LOG_BACKUPS", 5)),
+)
@@ -0,0 +1,113 @@
+"""
+User statistics
+
+Stats come from the user's rollup document (see rollups.py), a single
+_id lookup. Users without a complete rollup (whose history predates
+rollups and has not been backfilled by a rebuild) fall back to one
+aggregation pipeline: a $match on user_id
+followed by a $facet, so reflections are never pulled into the app. The
+$match + $project is covered by the reflection
+user_id_1_created_at_-1_stats index and never fetches full documents.
+"""
+
+from datetime import date
+
+from rollups import ROLLUP_COLLECTION
+
+_DELTA = {"$subtract": ["$mood_after", "$mood_before"]}
+
+
+def user_stats_pipeline(user_id: str) -> list:
+    return [
+        {"$match": {"user_id": user_id}},
+        {"$project": {"_id": 0, "challenge_id": 1, "mood_before": 1, "mood_after": 1, "created_at": 1}},
+        {"$facet": {
+            "totals": [
+                {"$group": {"_id": None, "count": {"$sum": 1}, "avg_mood_delta": {"$avg": _DELTA}}},
+            ],
+            "mood_delta": [
+                {"$group": {"_id": _DELTA, "count": {"$sum": 1}}},
+                {"$sort": {"_id": 1}},
+            ],
+            "weekly": [
+                # ISO week, e.g. "2024-W05"
+                {"$group": {"_id": {"$dateToString": {"format": "%G-W%V", "date": "$created_at"}}, "count": {"$sum": 1}}},
+                {"$sort": {"_id": 1}},
+            ],
+            "per_challenge": [
+                {"$group": {
+                    "_id": "$challenge_id",
+                    "count": {"$sum": 1},
+                    "avg_mood_before": {"$avg": "$mood_before"},
+                    "avg_mood_after": {"$avg": "$mood_after"},
+                    "avg_mood_delta": {"$avg": _DELTA},
+                }},
+                {"$sort": {"count": -1, "_id": 1}},
+            ],
+        }},
+    ]
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+def shape_user_stats(user_id: str, result: dict) -> dict:
+    """Turn the $facet output into the /user/{id}/stats response"""
+    totals = result["totals"][0] if result["totals"] else {"count": 0, "avg_mood_delta": None}
+    return {
+        "user_id": user_id,
+        "completions": totals["count"],
+        "avg_mood_delta": _round(totals["avg_mood_delta"]),
+        "mood_delta_histogram": [{"delta": r["_id"], "count": r["count"]} for r in result["mood_delta"]],
+        "completions_per_week": [{"week": r["_id"], "count": r["count"]} for r in result["weekly"]],
+        "per_challenge": [
+            {
+                "challenge_id": r["_id"],
+                "count": r["count"],
+                "avg_mood_before": _round(r["avg_mood_before"]),
+                "avg_mood_after": _round(r["avg_mood_after"]),
+                "avg_mood_delta": _round(r["avg_mood_delta"]),
+            }
+            for r in result["per_challenge"]
+        ],
+    }
+
+
+def stats_from_rollup(user_id: str, rollup: dict) -> dict:
+    """Build the same response as shape_user_stats from a rollup document"""
+    count = rollup.get("count", 0)
+    weeks = {}
+    for day, n in rollup.get("days", {}).items():
+        year, week, _ = date.fromisoformat(day).isocalendar()
+        label = f"{year}-W{week:02d}"
+        weeks[label] = weeks.get(label, 0) + n
+    challenges = sorted(rollup.get("challenges", {}).values(), key=lambda c: (-c["count"], c["challenge_id"]))
+    return {
+        "user_id": user_id,
+        "completions": count,
+        "avg_mood_delta": _round((rollup["mood_after_sum"] - rollup["mood_before_sum"]) / count) if count else None,
+        "mood_delta_histogram": [
+            {"delta": int(delta), "count": n}
+            for delta, n in sorted(rollup.get("delta_counts", {}).items(), key=lambda kv: int(kv[0]))
+        ],
+        "completions_per_week": [{"week": w, "count": n} for w, n in sorted(weeks.items())],
+        "per_challenge": [
+            {
+                "challenge_id": c["challenge_id"],
+                "count": c["count"],
+                "avg_mood_before": _round(c["mood_before_sum"] / c["count"]),
+                "avg_mood_after": _round(c["mood_after_sum"] / c["count"]),
+                "avg_mood_delta": _round((c["mood_after_sum"] - c["mood_before_sum"]) / c["count"]),
+            }
+            for c in challenges
+        ],
+    }
+
+
+async def user_stats(adb, user_id: str) -> dict:
+    rollup = await adb[ROLLUP_COLLECTION].find_one({"_id": user_id}, {"mood_after_counts": 0})
+    if rollup is not None and rollup.get("complete"):
+        return stats_from_rollup(user_id, rollup)
+    results = await adb["reflection"].aggregate(user_stats_pipeline(user_id)).to_list(length=1)
+    return shape_user_stats(user_id, results[0])
@@ -0,0 +1,37 @@
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+# Allow `python -m pytest` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import main  # noqa: E402
+from cache import TTLCache  # noqa: E402
+from gallery import GalleryFeed  # noqa: E402
+from leaderboard import Leaderboards  # noqa: E402
+
+from fakes import FakeDatabase, _naive  # noqa: E402
+
+
+def _completion(doc: dict) -> None:
+    # COMPLETION_PIPELINE, evaluated the way MongoDB would against $$NOW
+    now = datetime.now(timezone.utc)
+    gain, streak = main.apply_completion(doc.get("last_completed_at"), doc.get("streak", 0), now)
+    doc["xp"] = doc.get("xp", 0) + gain
+    doc["streak"] = streak
+    doc["last_completed_at"] = _naive(now)
+
+
+@pytest.fixture
+def adb(monkeypatch):
+    """The app wired to an empty in-memory database, with fresh per-worker state"""
+    fake = FakeDatabase(pipeline_update=_completion)
+    monkeypatch.setattr(database, "_async_db", fake)
+    monkeypatch.setattr(main, "profile_cache", TTLCache(maxsize=100, ttl=30))
+    monkeypatch.setattr(main, "leaderboards", Leaderboards())
+    monkeypatch.setattr(main, "gallery_feed", GalleryFeed())
+    monkeypatch.setattr(main, "reflection_writer", None)
+    return fake
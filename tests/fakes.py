@@ -0,0 +1,228 @@
+"""
+In-memory stand-in for the parts of Motor the app uses
+
+Supports equality, $in and range filters (including dotted paths), $set /
+$inc / $setOnInsert / $push ($each, $slice) updates with upserts, bulk_write of UpdateOne, unordered
+insert_many reporting duplicates as a BulkWriteError, and
+cursors with sort / limit / to_list. Each collection records the filters
+it was queried with in `queries`. Pipeline updates (COMPLETION_PIPELINE)
+are applied through `pipeline_update`, a Python function given the stored
+document, since the fake has no aggregation engine.
+
+Documents are stored and returned with naive UTC datetimes, as PyMongo
+returns them, so code paths that compare stored and request times are
+exercised the same way as against a real server.
+"""
+
+import copy
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+
+def _naive(value):
+    if isinstance(value, datetime):
+        # BSON dates are millisecond precision and come back naive UTC
+        value = value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    if isinstance(value, dict):
+        return {k: _naive(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_naive(v) for v in value]
+    return value
+
+
+def _get(doc, path):
+    node = doc
+    for part in path.split("."):
+        if not isinstance(node, dict) or part not in node:
+            return None
+        node = node[part]
+    return node
+
+
+def _set(doc, path, value):
+    *parents, leaf = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[leaf] = value
+
+
+_OPERATORS = {
+    "$in": lambda v, arg: v in arg,
+    "$lt": lambda v, arg: v is not None and v < arg,
+    "$lte": lambda v, arg: v is not None and v <= arg,
+    "$gt": lambda v, arg: v is not None and v > arg,
+    "$gte": lambda v, arg: v is not None and v >= arg,
+    "$ne": lambda v, arg: v != arg,
+    "$exists": lambda v, arg: (v is not None) == arg,
+}
+
+
+def matches(doc, query) -> bool:
+    for key, expected in query.items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in expected):
+                return False
+            continue
+        value = _get(doc, key)
+        if isinstance(expected, dict) and expected and all(k.startswith("$") for k in expected):
+            if not all(_OPERATORS[op](value, _naive(arg)) for op, arg in expected.items()):
+                return False
+        elif value != _naive(expected):
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    if all(not v for k, v in projection.items() if k != "_id") and any(k != "_id" for k in projection):
+        out = {k: v for k, v in doc.items() if k not in projection}
+    else:
+        out = {k: doc[k] for k, v in projection.items() if v and k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+    if projection.get("_id", 1) == 0:
+        out.pop("_id", None)
+    return copy.deepcopy(out)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self._docs = docs
+        self._limit = 0
+
+    def sort(self, key, direction=None):
+        keys = [(key, direction or 1)] if isinstance(key, str) else list(key)
+        for field, way in reversed(keys):
+            self._docs.sort(key=lambda d: (_get(d, field) is not None, _get(d, field)), reverse=way < 0)
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def _result(self):
+        return self._docs[: self._limit] if self._limit else self._docs
+
+    async def to_list(self, length=None):
+        docs = self._result()
+        return docs[:length] if length else docs
+
+    def __aiter__(self):
+        async def gen():
+            for d in self._result():
+                yield d
+        return gen()
+
+
+class FakeCollection:
+    def __init__(self, name, pipeline_update=None):
+        self.name = name
+        self.docs = {}
+        self.pipeline_update = pipeline_update
+        # Every filter a read or update was given, in order
+        self.queries = []
+
+    def _find(self, query):
+        self.queries.append(query or {})
+        return [d for d in self.docs.values() if matches(d, query or {})]
+
+    def find(self, query=None, projection=None, **kwargs):
+        return FakeCursor([_project(d, projection) for d in self._find(query)])
+
+    async def find_one(self, query=None, projection=None, **kwargs):
+        found = self._find(query)
+        return _project(found[0], projection) if found else None
+
+    async def count_documents(self, query):
+        return len(self._find(query))
+
+    async def insert_one(self, doc):
+        doc.setdefault("_id", ObjectId())
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError(f"duplicate _id in {self.name}")
+        self.docs[doc["_id"]] = _naive(copy.deepcopy(doc))
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    async def insert_many(self, docs, ordered=True):
+        errors = []
+        for i, doc in enumerate(docs):
+            try:
+                await self.insert_one(doc)
+            except DuplicateKeyError as e:
+                if ordered:
+                    raise
+                # What the server reports for an unordered insert: every document
+                # is attempted and the failures come back together
+                errors.append({"index": i, "code": 11000, "errmsg": str(e)})
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(docs) - len(errors)})
+        return SimpleNamespace(inserted_ids=[d["_id"] for d in docs])
+
+    def _apply(self, doc, update, inserting):
+        if isinstance(update, list):
+            self.pipeline_update(doc)
+            return
+        for path, value in update.get("$set", {}).items():
+            _set(doc, path, _naive(copy.deepcopy(value)))
+        for path, amount in update.get("$inc", {}).items():
+            _set(doc, path, (_get(doc, path) or 0) + amount)
+        for path, push in update.get("$push", {}).items():
+            items = (_get(doc, path) or []) + copy.deepcopy(push["$each"])
+            _set(doc, path, items[push["$slice"]:] if "$slice" in push else items)
+        if inserting:
+            for path, value in update.get("$setOnInsert", {}).items():
+                _set(doc, path, _naive(copy.deepcopy(value)))
+
+    def _update(self, query, update, upsert=False):
+        found = self._find(query)
+        if found:
+            self._apply(found[0], update, inserting=False)
+            return SimpleNamespace(matched_count=1, upserted_id=None, doc=found[0])
+        if not upsert:
+            return SimpleNamespace(matched_count=0, upserted_id=None, doc=None)
+        doc = {k: _naive(v) for k, v in query.items() if not isinstance(v, dict)}
+        doc.setdefault("_id", ObjectId())
+        self._apply(doc, update, inserting=True)
+        self.docs[doc["_id"]] = doc
+        return SimpleNamespace(matched_count=0, upserted_id=doc["_id"], doc=doc)
+
+    async def update_one(self, query, update, upsert=False):
+        return self._update(query, update, upsert)
+
+    async def update_many(self, query, update):
+        found = self._find(query)
+        for doc in found:
+            self._apply(doc, update, inserting=False)
+        return SimpleNamespace(matched_count=len(found), modified_count=len(found))
+
+    async def find_one_and_update(self, query, update, projection=None, upsert=False, return_document=False, **kwargs):
+        before = self._find(query)
+        before = copy.deepcopy(before[0]) if before else None
+        result = self._update(query, update, upsert)
+        doc = result.doc if return_document else before
+        return _project(doc, projection) if doc is not None else None
+
+    async def bulk_write(self, requests, ordered=True):
+        results = [self._update(op._filter, op._doc, op._upsert) for op in requests]
+        return SimpleNamespace(matched_count=sum(r.matched_count for r in results))
+
+
+class FakeDatabase:
+    """adb[...] for the app; collections spring into existence on first use"""
+
+    def __init__(self, pipeline_update=None):
+        self.collections = {}
+        self.pipeline_update = pipeline_update
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(name, self.pipeline_update)
+        return self.collections[name]
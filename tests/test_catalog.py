@@ -0,0 +1,54 @@
+import asyncio
+import itertools
+
+from bson import ObjectId
+
+from catalog import ChallengeCatalog, ChallengeIndex
+from fakes import FakeDatabase
+
+MOODS = ("social", "solo", "uplifting")
+ENVIRONMENTS = ("home", "public", "school", "work")
+
+
+def _challenges(n):
+    return [
+        {
+            "_id": str(i),
+            "title": f"Challenge {i}",
+            "mood": MOODS[i % 3],
+            "environment": ENVIRONMENTS[i % 4],
+            "confidence": i % 5 + 1,
+        }
+        for i in range(n)
+    ]
+
+
+def test_masks_match_a_scan():
+    challenges = _challenges(50)
+    index = ChallengeIndex(challenges)
+    for mood, environment, lo, hi in itertools.product(MOODS, ENVIRONMENTS, (None, 2), (None, 4)):
+        mask = index.match(mood=mood, environment=environment, confidence_min=lo, confidence_max=hi)
+        expected = [
+            pos
+            for pos, c in enumerate(challenges)
+            if c["mood"] == mood
+            and c["environment"] == environment
+            and (lo is None or c["confidence"] >= lo)
+            and (hi is None or c["confidence"] <= hi)
+        ]
+        assert mask == sum(1 << pos for pos in expected)
+
+
+def test_load_from_skips_invalid_documents():
+    adb = FakeDatabase()
+    valid = {"title": "Say hi", "mood": "social", "environment": "work", "confidence": 2}
+    asyncio.run(adb["challenge"].insert_many([
+        {"_id": ObjectId(), **valid},
+        {"_id": ObjectId(), **valid, "confidence": 9},
+    ]))
+    catalog = ChallengeCatalog(_challenges(3))
+
+    asyncio.run(catalog.load_from(adb))
+
+    assert len(catalog.index) == 1
+    assert catalog.pick(0, mood="social")["title"] == "Say hi"
@@ -0,0 +1,35 @@
+import asyncio
+import csv
+import io
+from datetime import datetime, timezone
+
+import orjson
+
+import export
+from fakes import FakeDatabase
+
+
+def _export(fmt):
+    adb = FakeDatabase()
+    asyncio.run(adb["reflection"].insert_one({
+        "user_id": "u1",
+        "challenge_id": "c1",
+        "mood_before": 2,
+        "mood_after": 4,
+        "created_at": datetime(2024, 3, 1, 12, 30, 0, 250000, tzinfo=timezone.utc),
+    }))
+
+    async def drain():
+        return b"".join([chunk async for chunk in export.stream_reflections(adb, "u1", fmt)])
+
+    return asyncio.run(drain()).decode()
+
+
+def test_ndjson_created_at_has_utc_offset():
+    (line,) = _export("ndjson").splitlines()
+    assert orjson.loads(line)["created_at"] == "2024-03-01T12:30:00.250000+00:00"
+
+
+def test_csv_created_at_has_utc_offset():
+    (record,) = csv.DictReader(io.StringIO(_export("csv")))
+    assert record["created_at"] == "2024-03-01T12:30:00.250000+00:00"
@@ -0,0 +1,53 @@
+import asyncio
+import time
+from urllib.parse import quote_plus, unquote_plus
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+import main
+from gallery import decode_cursor, encode_cursor
+from main import ReflectionRequest
+
+
+def _reflect(user_id, i):
+    payload = ReflectionRequest(
+        user_id=user_id, challenge_id="c1", mood_before=2, mood_after=4, note=f"note {i}", is_public=True
+    )
+    return asyncio.run(main.submit_reflection(payload, idempotency_key=None))["reflection_id"]
+
+
+def test_pages_do_not_repeat_after_refresh(adb):
+    user_id = str(asyncio.run(adb["user"].insert_one({"name": "Sam", "xp": 0, "streak": 0})).inserted_id)
+    asyncio.run(main.gallery_feed.load(adb))
+    posted = [_reflect(user_id, i) for i in range(6)]
+    # Page 1 comes from the entries /reflect added to the buffer
+    main.gallery_feed._loaded_at = time.monotonic()
+
+    first = asyncio.run(main.gallery(limit=3))
+    cursor = first.headers["x-next-cursor"]
+    # The buffer is re-synced from MongoDB (millisecond timestamps) before page 2
+    asyncio.run(main.gallery_feed.load(adb))
+    second = asyncio.run(main.gallery(limit=3, before=unquote_plus(quote_plus(cursor))))
+
+    seen = [item["id"] for item in orjson.loads(first.body) + orjson.loads(second.body)]
+    assert len(seen) == len(set(seen)) == 6
+    assert set(seen) == set(posted)
+
+
+def test_cursor_survives_query_string_round_trip(adb):
+    user_id = str(asyncio.run(adb["user"].insert_one({"name": "Sam", "xp": 0, "streak": 0})).inserted_id)
+    _reflect(user_id, 0)
+    item = main.gallery_feed._entries[0][2]
+
+    cursor = encode_cursor(item)
+    # Pasted into ?before= unencoded, as clients do
+    assert decode_cursor(unquote_plus(cursor)) == (item["created_at"], item["id"])
+
+
+@pytest.mark.parametrize("before", ["9999999999999999,x", "99999999999999999999,x", "2024-13-01,x", "x"])
+def test_malformed_cursor_is_a_bad_request(adb, before):
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(main.gallery(limit=3, before=before))
+    assert e.value.status_code == 400
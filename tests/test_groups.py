@@ -0,0 +1,52 @@
+import asyncio
+
+from bson import ObjectId
+
+import groups
+from fakes import FakeCursor
+
+
+def _group(adb, members):
+    gid = str(ObjectId())
+    asyncio.run(groups.create_group(adb, "Walkers", members[0], "ABC234", group_id=gid))
+    for user_id in members[1:]:
+        asyncio.run(groups.join_group(adb, gid, user_id))
+    return gid
+
+
+def _capture_aggregate(adb):
+    pipelines = []
+
+    def aggregate(pipeline):
+        pipelines.append(pipeline)
+        return FakeCursor([])
+
+    adb["reflection"].aggregate = aggregate
+    return pipelines
+
+
+def test_feed_starts_at_assignment_and_is_member_driven(adb):
+    gid = _group(adb, ["owner", "u2", "u3"])
+    asyncio.run(groups.set_group_challenge(adb, gid, "owner", "c1"))
+    assigned_at = adb["group"].docs[ObjectId(gid)]["challenge_assigned_at"]
+    pipelines = _capture_aggregate(adb)
+
+    asyncio.run(groups.group_feed(adb, gid, limit=10))
+
+    match = pipelines[0][0]["$match"]
+    assert match["challenge_id"] == "c1"
+    assert match["created_at"] == {"$gte": assigned_at}
+    assert sorted(match["user_id"]["$in"]) == ["owner", "u2", "u3"]
+    assert not any("$lookup" in stage for stage in pipelines[0])
+
+
+def test_large_group_feed_uses_lookup(adb, monkeypatch):
+    monkeypatch.setattr(groups, "SMALL_GROUP", 1)
+    gid = _group(adb, ["owner", "u2"])
+    asyncio.run(groups.set_group_challenge(adb, gid, "owner", "c1"))
+    pipelines = _capture_aggregate(adb)
+
+    asyncio.run(groups.group_feed(adb, gid))
+
+    assert "created_at" in pipelines[0][0]["$match"]
+    assert any("$lookup" in stage for stage in pipelines[0])
@@ -0,0 +1,51 @@
+import indexes
+
+
+def test_full_scans_are_registered_shapes():
+    labels = [shape[0] for shape in indexes.QUERY_SHAPES] + [shape[0] for shape in indexes.AGGREGATION_SHAPES]
+    assert len(labels) == len(set(labels))
+    assert indexes.FULL_SCANS <= set(labels)
+
+
+def test_aggregation_plans_come_from_every_cursor_stage():
+    explain = {"stages": [
+        {"$cursor": {"queryPlanner": {
+            "winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}},
+            "rejectedPlans": [{"stage": "COLLSCAN"}],
+        }}},
+        {"$lookup": {"from": "groupmember"}},
+    ]}
+
+    result = indexes._result("group feed", "reflection", explain)
+
+    assert result["stages"] == ["FETCH", "IXSCAN"]
+    assert not result["collscan"]
+
+
+def test_registered_full_scan_is_not_a_failure(monkeypatch):
+    class Cursor:
+        def limit(self, n):
+            return self
+
+        def explain(self):
+            return {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+
+    class DB:
+        def __getitem__(self, name):
+            return self
+
+        def find(self, *args):
+            return Cursor()
+
+        def command(self, *args, **kwargs):
+            return {"queryPlanner": {"winningPlan": {"stage": "IXSCAN"}}}
+
+    monkeypatch.setattr(indexes, "QUERY_SHAPES", [
+        ("leaderboard users", "user", {}, {"xp": 1}, None, 0),
+        ("user by email", "user", {"email": "x"}, None, None, 1),
+    ])
+    monkeypatch.setattr("database.get_db", lambda: DB())
+
+    assert indexes.main(["check"]) == 1
+    monkeypatch.setattr(indexes, "QUERY_SHAPES", indexes.QUERY_SHAPES[:1])
+    assert indexes.main(["check"]) == 0
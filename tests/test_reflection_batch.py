@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import main
+from main import QueuedReflectionRequest
+
+
+def _user(adb, **fields):
+    doc = {"name": "Sam", "email": "sam@example.com", "mode": "casual", "xp": 0, "streak": 0, "preferences": {}, **fields}
+    asyncio.run(adb["user"].insert_one(doc))
+    return str(doc["_id"])
+
+
+def _item(user_id, completed_at, challenge_id="c1"):
+    return QueuedReflectionRequest(
+        user_id=user_id, challenge_id=challenge_id, mood_before=2, mood_after=4, completed_at=completed_at
+    )
+
+
+def test_older_replay_keeps_streak_and_last_completed(adb):
+    now = datetime.now(timezone.utc)
+    user_id = _user(adb, xp=100, streak=5, last_completed_at=now - timedelta(minutes=5))
+
+    asyncio.run(main.submit_reflection_batch([_item(user_id, now - timedelta(days=1))]))
+
+    user = next(iter(adb["user"].docs.values()))
+    assert user["streak"] == 5
+    assert user["xp"] == 105
+    assert user["last_completed_at"] >= (now - timedelta(minutes=6)).replace(tzinfo=None)
+
+
+def test_replay_extends_streak_in_order(adb):
+    now = datetime.now(timezone.utc)
+    user_id = _user(adb, streak=1, last_completed_at=now - timedelta(days=3))
+
+    items = [_item(user_id, now - timedelta(days=d)) for d in (0, 2, 1)]
+    asyncio.run(main.submit_reflection_batch(items))
+
+    user = next(iter(adb["user"].docs.values()))
+    assert user["streak"] == 4
+    assert user["xp"] == 30
+
+
+def test_future_completion_is_clamped_to_now(adb):
+    user_id = _user(adb)
+    future = datetime.now(timezone.utc) + timedelta(days=30)
+
+    asyncio.run(main.submit_reflection_batch([_item(user_id, future)]))
+
+    stored = next(iter(adb["reflection"].docs.values()))
+    assert stored["created_at"] <= datetime.now(timezone.utc).replace(tzinfo=None)
+    user = next(iter(adb["user"].docs.values()))
+    assert user["last_completed_at"] <= datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def test_concurrent_reflect_is_not_overwritten(adb, monkeypatch):
+    now = datetime.now(timezone.utc)
+    user_id = _user(adb, xp=10, streak=1, last_completed_at=now - timedelta(days=1))
+    users = adb["user"]
+    bulk_write = users.bulk_write
+    raced = []
+
+    async def racing_bulk_write(requests, ordered=True):
+        if not raced:
+            # A /reflect lands between the batch's read and its write
+            raced.append(True)
+            _completion_now(users)
+        return await bulk_write(requests, ordered)
+
+    monkeypatch.setattr(users, "bulk_write", racing_bulk_write)
+    asyncio.run(main.submit_reflection_batch([_item(user_id, now - timedelta(hours=2))]))
+
+    user = next(iter(users.docs.values()))
+    # The /reflect's completion (+10, streak 2, last = now) survives, and the
+    # replayed item, now older than last_completed_at, only adds repeat XP
+    assert user["xp"] == 25
+    assert user["streak"] == 2
+    assert user["last_completed_at"] >= now.replace(tzinfo=None) - timedelta(seconds=1)
+
+
+def test_one_bulk_write_retries_only_the_raced_user(adb, monkeypatch):
+    now = datetime.now(timezone.utc)
+    calm = _user(adb, xp=10, streak=1, last_completed_at=now - timedelta(days=1))
+    raced = _user(adb, email="kim@example.com", xp=10, streak=1, last_completed_at=now - timedelta(days=1))
+    users = adb["user"]
+    bulk_write = users.bulk_write
+    sent = []
+
+    async def racing_bulk_write(requests, ordered=True):
+        if not sent:
+            _completion_now(users, raced)
+        sent.append(len(requests))
+        return await bulk_write(requests, ordered)
+
+    monkeypatch.setattr(users, "bulk_write", racing_bulk_write)
+    items = [_item(calm, now - timedelta(hours=2)), _item(raced, now - timedelta(hours=2))]
+    asyncio.run(main.submit_reflection_batch(items))
+
+    # Both users in the first round trip; only the raced one resent
+    assert sent == [2, 1]
+    by_id = {str(u["_id"]): u for u in users.docs.values()}
+    assert (by_id[calm]["xp"], by_id[calm]["streak"]) == (20, 2)
+    assert (by_id[raced]["xp"], by_id[raced]["streak"]) == (25, 2)
+    assert main.leaderboards.board("xp", "all").rank(calm) is not None
+
+
+def _completion_now(users, user_id=None):
+    doc = next(u for u in users.docs.values() if user_id is None or str(u["_id"]) == user_id)
+    users.pipeline_update(doc)
@@ -0,0 +1,48 @@
+import asyncio
+
+import main
+import stats
+from fakes import FakeCursor
+from main import ReflectionRequest, SignupRequest
+
+
+def _reflect(user_id, challenge_id="c1"):
+    payload = ReflectionRequest(user_id=user_id, challenge_id=challenge_id, mood_before=2, mood_after=4)
+    return asyncio.run(main.submit_reflection(payload, idempotency_key=None))
+
+
+def _stub_aggregate(adb, count):
+    calls = []
+
+    def aggregate(pipeline):
+        calls.append(pipeline)
+        totals = [{"count": count, "avg_mood_delta": 2.0}] if count else []
+        return FakeCursor([{"totals": totals, "mood_delta": [], "weekly": [], "per_challenge": []}])
+
+    adb["reflection"].aggregate = aggregate
+    return calls
+
+
+def test_new_user_stats_come_from_rollup(adb):
+    user_id = asyncio.run(main.signup(SignupRequest(name="Sam"), idempotency_key=None))["user_id"]
+    _reflect(user_id)
+    _reflect(user_id, "c2")
+    calls = _stub_aggregate(adb, 0)
+
+    result = asyncio.run(stats.user_stats(adb, user_id))
+
+    assert result["completions"] == 2
+    assert not calls
+
+
+def test_partial_rollup_falls_back_to_pipeline(adb):
+    # A user from before rollups: history exists, then one /reflect upserts
+    # a rollup holding only that reflection
+    user_id = str(asyncio.run(adb["user"].insert_one({"name": "Old", "xp": 0, "streak": 0})).inserted_id)
+    _reflect(user_id)
+    calls = _stub_aggregate(adb, 40)
+
+    result = asyncio.run(stats.user_stats(adb, user_id))
+
+    assert result["completions"] == 40
+    assert len(calls) == 1
@@ -0,0 +1,86 @@
+import asyncio
+
+import orjson
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+import main
+from main import ModeRequest, QueuedReflectionRequest, ReflectionRequest, SignupRequest
+
+
+def _signup(name="Sam"):
+    return asyncio.run(main.signup(SignupRequest(name=name, mode="casual"), idempotency_key=None))["user_id"]
+
+
+def _user_lookups(adb):
+    return [q for q in adb["user"].queries if "_id" in q]
+
+
+def _assert_id_hits(adb, user_id):
+    lookups = _user_lookups(adb)
+    assert lookups
+    for query in lookups:
+        target = query["_id"]
+        if isinstance(target, dict):
+            assert target["$in"] == [ObjectId(user_id)]
+        else:
+            assert target == ObjectId(user_id)
+
+
+def test_signup_returns_the_stored_object_id(adb):
+    user_id = _signup()
+
+    assert list(adb["user"].docs) == [ObjectId(user_id)]
+
+
+def test_profile_by_signup_id(adb):
+    user_id = _signup()
+
+    profile = orjson.loads(asyncio.run(main.get_profile(user_id)).body)
+
+    assert profile["user"]["_id"] == user_id
+    assert profile["user"]["name"] == "Sam"
+    _assert_id_hits(adb, user_id)
+
+
+def test_mode_by_signup_id(adb):
+    user_id = _signup()
+
+    assert asyncio.run(main.set_mode(user_id, ModeRequest(mode="challenge"))) == {"ok": True, "mode": "challenge"}
+
+    assert adb["user"].docs[ObjectId(user_id)]["mode"] == "challenge"
+    _assert_id_hits(adb, user_id)
+
+
+def test_reflect_by_signup_id(adb):
+    user_id = _signup()
+    payload = ReflectionRequest(user_id=user_id, challenge_id="c1", mood_before=2, mood_after=4)
+
+    result = asyncio.run(main.submit_reflection(payload, idempotency_key=None))
+
+    assert result["xp"] == 10 and result["streak"] == 1
+    assert adb["user"].docs[ObjectId(user_id)]["xp"] == 10
+    _assert_id_hits(adb, user_id)
+
+
+def test_batch_by_signup_id(adb):
+    user_id = _signup()
+    items = [QueuedReflectionRequest(user_id=user_id, challenge_id=c, mood_before=2, mood_after=4) for c in ("c1", "c2")]
+
+    result = orjson.loads(asyncio.run(main.submit_reflection_batch(items)).body)
+
+    assert len(result["reflection_ids"]) == 2
+    assert adb["user"].docs[ObjectId(user_id)]["xp"] == 15
+    _assert_id_hits(adb, user_id)
+
+
+@pytest.mark.parametrize("bad_id", ["u1", "not-an-object-id", "0" * 23])
+def test_malformed_ids_are_404_without_a_query(adb, bad_id):
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(main.get_profile(bad_id))
+    assert exc.value.status_code == 404
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(main.set_mode(bad_id, ModeRequest(mode="casual")))
+    assert exc.value.status_code == 404
+    assert not adb["user"].queries
@@ -0,0 +1,178 @@
+import asyncio
+import os
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import AutoReconnect
+
+import writebehind
+from fakes import FakeDatabase
+from writebehind import WriteBehindBuffer, read_segment
+
+
+def _buffer(tmp_path, **kwargs):
+    buffer = WriteBehindBuffer("reflection", str(tmp_path), fsync=False, **kwargs)
+    buffer.open()
+    return buffer
+
+
+def _submit(buffer, n):
+    async def go():
+        for _ in range(n):
+            assert await buffer.submit({"_id": ObjectId()})
+    asyncio.run(go())
+
+
+def _crash(buffer):
+    """Die without flushing: the fd (and its flock) goes, the segment stays"""
+    os.close(buffer._fd)
+    for _, fd, _ in buffer._unflushed:
+        os.close(fd)
+
+
+def _submitted(buffer, n):
+    docs = [{"_id": ObjectId(), "n": i} for i in range(n)]
+
+    async def go():
+        for doc in docs:
+            assert await buffer.submit(doc)
+    asyncio.run(go())
+    return [doc["_id"] for doc in docs]
+
+
+def _down(adb):
+    async def insert_many(docs, ordered=True):
+        raise AutoReconnect("connection refused")
+    adb["reflection"].insert_many = insert_many
+
+
+def test_outage_keeps_one_rotated_segment(tmp_path):
+    adb = FakeDatabase()
+    buffer = _buffer(tmp_path)
+    _down(adb)
+
+    for _ in range(5):
+        _submit(buffer, 3)
+        asyncio.run(buffer.flush(adb))
+
+    # One failing segment plus the live one, not a segment (and fd) per attempt
+    assert len(buffer._unflushed) == 1
+    assert len(os.listdir(tmp_path)) == 2
+    assert buffer.queued == 15
+
+    del adb["reflection"].insert_many
+    asyncio.run(buffer.flush(adb))
+    asyncio.run(buffer.flush(adb))
+    assert len(adb["reflection"].docs) == 15
+    assert buffer.queued == 0
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_failed_segment_open_keeps_current_segment(tmp_path, monkeypatch):
+    adb = FakeDatabase()
+    buffer = _buffer(tmp_path)
+    _submit(buffer, 2)
+    segment, fd = buffer._segment, buffer._fd
+
+    def no_files(*args):
+        raise OSError(24, "Too many open files")
+
+    monkeypatch.setattr(writebehind.os, "open", no_files)
+    with pytest.raises(OSError):
+        asyncio.run(buffer.flush(adb))
+    monkeypatch.undo()
+
+    assert (buffer._segment, buffer._fd) == (segment, fd)
+    assert buffer._unflushed == []
+    assert buffer.queued == 2
+    _submit(buffer, 1)
+    asyncio.run(buffer.flush(adb))
+    assert len(adb["reflection"].docs) == 3
+
+
+def test_run_survives_non_mongo_errors(tmp_path, monkeypatch):
+    adb = FakeDatabase()
+    buffer = _buffer(tmp_path, flush_ms=1)
+    failures = []
+
+    def failing_rotate():
+        failures.append(1)
+        raise OSError(28, "No space left on device")
+
+    sleep = asyncio.sleep
+    monkeypatch.setattr(writebehind.asyncio, "sleep", lambda _: sleep(0))
+    monkeypatch.setattr(buffer, "_rotate", failing_rotate)
+
+    async def go():
+        task = asyncio.create_task(buffer.run(adb))
+        while len(failures) < 3 and not task.done():
+            await sleep(0.001)
+        assert not task.done()
+        task.cancel()
+
+    asyncio.run(go())
+    assert buffer.flush_errors >= 3
+
+
+def test_recover_replays_every_acknowledged_document(tmp_path):
+    adb = FakeDatabase()
+    crashed = _buffer(tmp_path)
+    acknowledged = _submitted(crashed, 5)
+    _crash(crashed)
+
+    fresh = _buffer(tmp_path)
+    assert asyncio.run(fresh.recover(adb)) == 5
+
+    assert set(adb["reflection"].docs) == set(acknowledged)
+    # Only the fresh buffer's live segment is left
+    assert os.listdir(tmp_path) == [os.path.basename(fresh._segment)]
+
+
+def test_recover_drops_a_torn_tail(tmp_path):
+    adb = FakeDatabase()
+    crashed = _buffer(tmp_path)
+    acknowledged = _submitted(crashed, 3)
+    segment = crashed._segment
+    # A crash mid-append: length prefix and part of a document that submit
+    # never acknowledged
+    with open(segment, "ab") as f:
+        f.write((200).to_bytes(4, "little") + b"\x02partial")
+    _crash(crashed)
+
+    assert [doc["_id"] for doc in read_segment(segment)] == acknowledged
+    asyncio.run(_buffer(tmp_path).recover(adb))
+    assert set(adb["reflection"].docs) == set(acknowledged)
+
+
+def test_second_recovery_does_not_duplicate(tmp_path):
+    adb = FakeDatabase()
+    crashed = _buffer(tmp_path)
+    acknowledged = _submitted(crashed, 4)
+    segment, data = crashed._segment, open(crashed._segment, "rb").read()
+    _crash(crashed)
+    asyncio.run(_buffer(tmp_path).recover(adb))
+
+    # The recovering worker died after the insert, before deleting the segment
+    with open(segment, "wb") as f:
+        f.write(data)
+    assert asyncio.run(_buffer(tmp_path).recover(adb)) == 0
+
+    assert sorted(adb["reflection"].docs) == sorted(acknowledged)
+    assert not os.path.exists(segment)
+
+
+def test_restart_with_same_pid_and_second_keeps_old_segment(tmp_path, monkeypatch):
+    # PID 1 in a container restarting within the same second picks the same name
+    monkeypatch.setattr(writebehind.time, "time", lambda: 1_700_000_000.0)
+    adb = FakeDatabase()
+    crashed = _buffer(tmp_path)
+    acknowledged = _submitted(crashed, 5)
+    _crash(crashed)
+
+    fresh = _buffer(tmp_path)
+    assert fresh._segment != crashed._segment
+    asyncio.run(fresh.recover(adb))
+    later = _submitted(fresh, 2)
+    asyncio.run(fresh.flush(adb))
+
+    assert set(adb["reflection"].docs) == set(acknowledged + later)
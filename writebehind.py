@@ -0,0 +1,300 @@
+"""
+Write-behind buffer
+
+Accepts documents (with client-generated _ids) into an in-process queue and
+writes them with insert_many every `flush_ms` or once `batch_size` are
+waiting, so the request path does not wait on the insert round trip.
+
+Every accepted document is first appended to a local spill segment
+(length-prefixed BSON, fsync'd unless fsync=False), in the same critical
+section that queues it. A flush rotates to a new segment, inserts the old
+segment's documents and deletes the segment once MongoDB has them, so
+whatever is on disk is exactly what MongoDB may not have yet. While a
+rotated segment is still failing, no further rotation happens: new
+documents stay in the live segment until the backlog is written. On startup
+leftover segments are replayed; inserts are keyed by _id, so replaying a
+batch that had in fact been written is harmless. Live segments are held
+under an exclusive flock, so workers sharing a spill directory only ever
+replay segments whose owner has died.
+
+The queue is bounded: when `max_queue` documents are waiting (for example
+while MongoDB is down) submit() returns False and the caller writes through.
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+import threading
+import time
+from itertools import count
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import bson
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+_DUPLICATE_KEY = 11000
+
+OnFlush = Callable[[object, List[dict]], Awaitable[None]]
+
+
+def read_segment(path: str) -> List[dict]:
+    """Documents in a spill segment; a torn write at the tail is dropped"""
+    with open(path, "rb") as f:
+        data = f.read()
+    docs, pos = [], 0
+    while pos + 4 <= len(data):
+        size = int.from_bytes(data[pos:pos + 4], "little")
+        if size < 5 or pos + size > len(data):
+            # Crashed mid-append; that submit never returned, so nothing was acknowledged
+            break
+        docs.append(bson.decode(data[pos:pos + size]))
+        pos += size
+    return docs
+
+
+class WriteBehindBuffer:
+    """Batched, spill-backed inserts into one collection"""
+
+    def __init__(
+        self,
+        collection: str,
+        spill_dir: str,
+        flush_ms: float = 50,
+        batch_size: int = 500,
+        max_queue: int = 10_000,
+        fsync: bool = True,
+        on_flush: Optional[OnFlush] = None,
+    ):
+        self.collection = collection
+        self.spill_dir = spill_dir
+        self.flush_interval = flush_ms / 1000
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.fsync = fsync
+        self.on_flush = on_flush
+
+        self._pending: List[dict] = []
+        # Rotated (path, fd, documents) whose insert has not succeeded yet
+        self._unflushed: List[Tuple[str, int, List[dict]]] = []
+        self._io_lock = threading.Lock()
+        self._seq = count()
+        self._fd: Optional[int] = None
+        self._segment: Optional[str] = None
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+        self.flushed = 0
+        self.flush_errors = 0
+        self.last_flush_ms: Optional[float] = None
+
+    # -- segments --
+
+    def _segment_path(self) -> str:
+        # Sortable: startup time, pid, sequence
+        return os.path.join(self.spill_dir, f"{self.collection}-{self._started:.0f}-{os.getpid()}-{next(self._seq):08d}.bson")
+
+    def _new_segment(self) -> Tuple[str, int]:
+        while True:
+            path = self._segment_path()
+            try:
+                # O_EXCL: a worker restarted with the same pid in the same second
+                # (PID 1 in a container) must not adopt its predecessor's segment;
+                # that one is left for recover()
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND, 0o600)
+                break
+            except FileExistsError:
+                continue
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._discard(path, fd)
+            raise
+        return path, fd
+
+    def _open_segment(self) -> None:
+        self._segment, self._fd = self._new_segment()
+
+    def _rotate(self) -> None:
+        """Swap in a fresh segment and move the current one to _unflushed
+
+        The new segment is opened first, so a failure (EMFILE, ENOSPC)
+        leaves the current segment and its pending documents in place.
+        """
+        with self._io_lock:
+            if not self._pending:
+                return
+            segment, fd = self._new_segment()
+            self._unflushed.append((self._segment, self._fd, self._pending))
+            self._segment, self._fd, self._pending = segment, fd, []
+
+    @staticmethod
+    def _discard(path: str, fd: int) -> None:
+        os.remove(path)
+        os.close(fd)  # releases the flock
+
+    def _append(self, doc: dict) -> None:
+        data = bson.encode(doc)
+        with self._io_lock:
+            os.write(self._fd, data)
+            if self.fsync:
+                os.fsync(self._fd)
+            self._pending.append(doc)
+
+    # -- public API --
+
+    @property
+    def queued(self) -> int:
+        return len(self._pending) + sum(len(batch) for _, _, batch in self._unflushed)
+
+    async def submit(self, doc: dict) -> bool:
+        """Queue a document that already has its _id; False if the queue is full"""
+        if self._fd is None or self._stopping or self.queued >= self.max_queue:
+            return False
+        await asyncio.to_thread(self._append, doc)
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+        return True
+
+    async def flush(self, adb) -> int:
+        """Write everything queued so far; returns the number of new documents"""
+        async with self._flush_lock:
+            if not self._unflushed:
+                # While earlier segments are still failing, new documents stay
+                # in the current segment instead of one more segment (and fd)
+                # per attempt
+                self._rotate()
+            written = 0
+            while self._unflushed:
+                segment, fd, batch = self._unflushed[0]
+                started = time.perf_counter()
+                try:
+                    written += await self._insert(adb, batch)
+                except PyMongoError as e:
+                    self.flush_errors += 1
+                    logger.warning("Write-behind flush of %d %s documents failed: %s", len(batch), self.collection, e)
+                    break
+                self.last_flush_ms = round((time.perf_counter() - started) * 1000, 3)
+                self._unflushed.pop(0)
+                self._discard(segment, fd)
+            return written
+
+    async def _insert(self, adb, docs: List[dict]) -> int:
+        if not docs:
+            return 0
+        new = docs
+        try:
+            await adb[self.collection].insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(err.get("code") != _DUPLICATE_KEY for err in errors):
+                raise
+            # Replayed documents that did reach MongoDB before a crash
+            duplicates = {err["index"] for err in errors}
+            new = [d for i, d in enumerate(docs) if i not in duplicates]
+        self.flushed += len(new)
+        if new and self.on_flush is not None:
+            try:
+                await self.on_flush(adb, new)
+            except Exception:
+                # The documents are stored; only the derived writes are missing
+                logger.exception("Write-behind on_flush failed for %d documents", len(new))
+        return len(new)
+
+    async def recover(self, adb) -> int:
+        """Replay segments left behind by a previous process"""
+        os.makedirs(self.spill_dir, exist_ok=True)
+        replayed = 0
+        prefix = f"{self.collection}-"
+        for name in sorted(os.listdir(self.spill_dir)):
+            if not (name.startswith(prefix) and name.endswith(".bson")):
+                continue
+            path = os.path.join(self.spill_dir, name)
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue  # another worker got there first
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)  # live segment of a running worker (or of this one)
+                continue
+            if not os.path.exists(path):
+                os.close(fd)
+                continue
+            try:
+                replayed += await self._insert(adb, read_segment(path))
+            except BaseException:
+                os.close(fd)
+                raise
+            self._discard(path, fd)
+        if replayed:
+            logger.info("Write-behind recovered %d %s documents from %s", replayed, self.collection, self.spill_dir)
+        return replayed
+
+    def open(self) -> None:
+        """Start accepting documents (spill segment only; no I/O to MongoDB)"""
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._started = time.time()
+        self._stopping = False
+        self._open_segment()
+
+    async def run(self, adb) -> None:
+        """Recover leftovers, then flush on a timer or when a batch fills, until cancelled"""
+        while True:
+            try:
+                await self.recover(adb)
+                break
+            except PyMongoError as e:
+                logger.warning("Write-behind recovery waiting for MongoDB: %s", e)
+                await asyncio.sleep(1)
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush(adb)
+            except Exception:
+                # Anything but a MongoDB error (e.g. OSError rotating segments);
+                # the task must keep running or the queue only ever grows
+                self.flush_errors += 1
+                logger.exception("Write-behind flush of %s failed", self.collection)
+                await asyncio.sleep(1)
+                continue
+            if self._unflushed:
+                # MongoDB is failing; retry about once a second instead of every tick
+                await asyncio.sleep(1)
+
+    async def close(self, adb) -> None:
+        """Stop accepting documents and drain the queue"""
+        self._stopping = True
+        if self._fd is None:
+            return
+        try:
+            await self.flush(adb)
+        finally:
+            with self._io_lock:
+                # The current segment is empty after a flush; if the flush
+                # failed, rotated segments stay on disk for the next start
+                if not self._pending:
+                    self._discard(self._segment, self._fd)
+                else:
+                    os.close(self._fd)
+                self._fd, self._segment = None, None
+            for _, fd, _ in self._unflushed:
+                os.close(fd)
+            self._unflushed = []
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "flushed": self.flushed,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": self.last_flush_ms,
+            "unflushed_segments": len(self._unflushed),
+        }